@@ -0,0 +1,105 @@
+import os
+import mmap
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+from peo.fhdr import ElfError
+
+
+AR_MAGIC = b"!<arch>\n"
+AR_THIN_MAGIC = b"!<thin>\n"
+AR_HDR_SIZE = 60
+AR_FMAG = b"`\n"
+
+
+def is_archive(filepath: str) -> bool:
+    try:
+        with open(filepath, "rb") as f:
+            return f.read(len(AR_MAGIC)) in (AR_MAGIC, AR_THIN_MAGIC)
+    except OSError:
+        return False
+
+
+# arのヘッダを読んで、メンバーの (名前, 中身の位置, 大きさ) を返す
+# シンボル表 ("/", "/SYM64/") と長い名前の表 ("//") はメンバーに含めない
+def parse_members(buf) -> List[Dict[str, Any]]:
+    if buf[:len(AR_MAGIC)] == AR_THIN_MAGIC:
+        raise ElfError("Thin archives are not supported")
+    if buf[:len(AR_MAGIC)] != AR_MAGIC:
+        raise ElfError("Not an archive")
+
+    members = []
+    longnames = b""
+    pos = len(AR_MAGIC)
+    while pos + AR_HDR_SIZE <= len(buf):
+        hdr = bytes(buf[pos:pos + AR_HDR_SIZE])
+        if hdr[58:60] != AR_FMAG:
+            raise ElfError(f"Malformed archive member header at {hex(pos)}")
+        name = hdr[:16].decode("ascii", "replace").rstrip(" ")
+        try:
+            size = int(hdr[48:58].decode("ascii").strip() or "0")
+        except ValueError:
+            raise ElfError(f"Malformed archive member size at {hex(pos)}")
+        offset = pos + AR_HDR_SIZE
+        if offset + size > len(buf):
+            raise ElfError("Truncated archive")
+        pos = offset + size + size % 2  # メンバーは2byte境界にそろえてある
+
+        if name in ("/", "/SYM64/", "__.SYMDEF", "__.SYMDEF SORTED"):
+            continue
+        if name == "//":  # GNUの長い名前の表
+            longnames = bytes(buf[offset:offset + size])
+            continue
+
+        if name.startswith("#1/"):  # BSD: 名前がヘッダの直後に入っている
+            n = int(name[3:])
+            name = bytes(buf[offset:offset + n]).rstrip(b"\0").decode("utf-8", "replace")
+            offset += n
+            size -= n
+        elif name.startswith("/") and name[1:].isdigit():  # GNU: 長い名前の表の位置
+            start = int(name[1:])
+            end = longnames.find(b"/\n", start)
+            name = longnames[start:end if end >= 0 else len(longnames)].decode("utf-8", "replace")
+        elif name.endswith("/"):
+            name = name[:-1]
+        members.append({"name": name, "offset": offset, "size": size})
+    return members
+
+
+def read_members(filepath: str) -> List[Dict[str, Any]]:
+    with open(filepath, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # 空のファイル
+            raise ElfError("Not an archive")
+    with mm:
+        return parse_members(mm)
+
+
+# メンバーの中身をアーカイブから切り出す
+def read_member(filepath: str, member: Dict[str, Any]) -> bytes:
+    with open(filepath, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return mm[member["offset"]:member["offset"] + member["size"]]
+
+
+# objdumpに渡せるよう、メモリ上のファイル(memfd)に書いてそのパスを返す
+# memfdが使えない環境では一時ファイルにする
+@contextmanager
+def member_path(data: bytes, name: str) -> Iterator[str]:
+    if hasattr(os, "memfd_create"):
+        fd = os.memfd_create(os.path.basename(name) or "member")
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+            yield f"/proc/{os.getpid()}/fd/{fd}"
+        finally:
+            os.close(fd)
+    else:
+        import tempfile
+
+        with tempfile.NamedTemporaryFile(suffix=os.path.basename(name)) as f:
+            f.write(data)
+            f.flush()
+            yield f.name
@@ -1,59 +1,179 @@
-import subprocess as sp
+from typing import Any, Dict, Optional
 
 from peo.util import Color
-from peo.fhdr import EType
+from peo.fhdr import EType, ElfError
 
 
-def checksec(filepath):
+labels = {
+    "relro": ["No RELRO", "Partial RELRO", "Full RELRO"],
+    "canary": ["No canary found", "Canary found"],
+    "nx": ["NX disabled", "NX enabled"],
+    "pie": ["Not an ELF file", "No PIE", "PIE enabled", "DSO", "REL"],
+}
+
+PT_GNU_STACK = 0x6474e551
+PT_GNU_RELRO = 0x6474e552
+PF_X = 0x1
+
+DT_NEEDED = 0x01
+DT_RPATH = 0x0f
+DT_DEBUG = 0x15
+DT_BIND_NOW = 0x18
+DT_RUNPATH = 0x1d
+DT_FLAGS = 0x1e
+DT_FLAGS_1 = 0x6ffffffb
+DF_BIND_NOW = 0x08
+DF_1_NOW = 0x01
+DF_1_PIE = 0x08000000
+
+# glibcに __<name>_chk 版がある関数
+fortifiable = {
+    "asprintf", "confstr", "dprintf", "explicit_bzero", "fdelt", "fgets",
+    "fgets_unlocked", "fgetws", "fgetws_unlocked", "fprintf", "fread",
+    "fread_unlocked", "fwprintf", "getcwd", "getdomainname", "getgroups",
+    "gethostname", "getlogin_r", "gets", "getwd", "longjmp", "mbsnrtowcs",
+    "mbsrtowcs", "mbstowcs", "memcpy", "memmove", "mempcpy", "memset",
+    "obstack_printf", "obstack_vprintf", "poll", "ppoll", "pread", "pread64",
+    "printf", "ptsname_r", "read", "readlink", "readlinkat", "realpath",
+    "recv", "recvfrom", "snprintf", "sprintf", "stpcpy", "stpncpy", "strcat",
+    "strcpy", "strncat", "strncpy", "swprintf", "syslog", "ttyname_r",
+    "vasprintf", "vdprintf", "vfprintf", "vfwprintf", "vprintf", "vsnprintf",
+    "vsprintf", "vswprintf", "vsyslog", "vwprintf", "wcpcpy", "wcpncpy",
+    "wcrtomb", "wcscat", "wcscpy", "wcsncat", "wcsncpy", "wcsnrtombs",
+    "wcsrtombs", "wcstombs", "wctomb", "wmemcpy", "wmemmove", "wmempcpy",
+    "wmemset", "wprintf"
+}
+
+
+# 各項目の判定結果 relro, canary, nx, pie はlabelsの添字
+# ヘッダ・動的セクション・シンボル表はファイルを一度mapして読む
+# bufを渡したときはファイルの代わりにその中身を見る (アーカイブのメンバー)
+def checksec_props(filepath, buf: Optional[bytes]=None) -> Dict[str, Any]:
+    from peo.elf import ELF, SHN_UNDEF
+
     RELRO = 0
     SSP = 0
     NX = 0
     PIE = 0
 
-    with open(filepath, "rb") as f:
-        buf = f.read(18)
-    proc = sp.run(
-        ["objdump", "-xT", filepath],
-        encoding="utf-8",
-        stdout=sp.PIPE,
-        stderr=sp.PIPE
-    )
+    with ELF(filepath, buf) as elf:
+        p_types = {seg["p_type"]: seg for seg in elf.segments}
+        dynamic = elf.dynamic
+        tags = dict(dynamic)
+
+        symtab = elf.section(".symtab")
+        dynsym = elf.section(".dynsym")
+        symbols = elf.read_symbols(symtab) if symtab else []
+        dynsyms = elf.read_symbols(dynsym) if dynsym else []
+
+        rpath = [elf.dynamic_string(val) for tag, val in dynamic if tag == DT_RPATH]
+        runpath = [elf.dynamic_string(val) for tag, val in dynamic if tag == DT_RUNPATH]
+        needed = [elf.dynamic_string(val) for tag, val in dynamic if tag == DT_NEEDED]
+        debug = elf.section(".debug_info") is not None
+        e_type = elf.hdr["e_type"]
 
     # RELRO
-    if "RELRO" in proc.stdout:
+    if PT_GNU_RELRO in p_types:
         RELRO = 1
-        if "FLAGS" in proc.stdout:
-            ndx = proc.stdout.index("FLAGS")
-            flags = int(proc.stdout[ndx:ndx+50].split("\n")[0].split(" ")[-1], 16)
-            if flags == 8:
-                RELRO = 2
+        if DT_BIND_NOW in tags or \
+                tags.get(DT_FLAGS, 0) & DF_BIND_NOW or \
+                tags.get(DT_FLAGS_1, 0) & DF_1_NOW:
+            RELRO = 2
 
     # SSP
-    if "__stack_chk_fail" in proc.stdout:
+    names = {sym["name"] for sym in symbols + dynsyms}
+    if "__stack_chk_fail" in names:
         SSP = 1
-    if "__intel_security_cookie" in proc.stdout:
+    if "__intel_security_cookie" in names:
         SSP = 1
 
     # NX
-    if "STACK" in proc.stdout:
+    if PT_GNU_STACK in p_types:
         NX = 1
-        ndx = proc.stdout.index("STACK")
-        perm = proc.stdout[ndx:ndx+150].split("\n")[1].split(" ")[-1]
-        if perm == "rwx":
+        if p_types[PT_GNU_STACK]["p_flags"] & PF_X:
             NX = 0
 
     # PIE
-    type = EType(int.from_bytes(buf[16:18], 'little')).name
-    if type == "EXEC":
+    if e_type == EType.EXEC.value:
         PIE = 1
-    elif type == "DYN":
-        if "DEBUG" in proc.stdout:
+    elif e_type == EType.DYN.value:
+        if DT_DEBUG in tags or tags.get(DT_FLAGS_1, 0) & DF_1_PIE:
             PIE = 2
         else:
             PIE = 3
-    elif type == "REL":
+    elif e_type == EType.REL.value:
         PIE = 4
 
+    # FORTIFY (呼び出している外部関数のうち _chk 版かどうか)
+    imported = {
+        sym["name"] for sym in symbols + dynsyms
+        if sym["st_shndx"] == SHN_UNDEF and sym["name"]
+    }
+    fortified = sorted(
+        name for name in imported
+        if name.startswith("__") and name.endswith("_chk")
+        and name[2:-4] in fortifiable
+    )
+    unfortified = sorted(name for name in imported if name in fortifiable)
+
+    return {
+        "relro": RELRO, "canary": SSP, "nx": NX, "pie": PIE,
+        "fortified": fortified, "fortifiable": unfortified,
+        "rpath": rpath, "runpath": runpath, "needed": needed,
+        "stripped": symtab is None, "debug": debug,
+        "symbols": len(symbols), "dynsyms": len(dynsyms),
+    }
+
+
+# アーカイブのメンバーを1つ調べる (ワーカープロセスで動く)
+def __member_props(filepath: str, member: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    from peo.archive import read_member
+
+    try:
+        return checksec_props(f"{filepath}({member['name']})", read_member(filepath, member))
+    except ElfError:
+        return None
+
+
+def checksec(filepath, jobs: Optional[int]=None):
+    from peo.archive import is_archive, read_members
+
+    if not is_archive(filepath):
+        try:
+            props = checksec_props(filepath)
+        except ElfError:
+            props = None
+        __print_props(props)
+        return
+
+    # アーカイブはメンバーごとに別プロセスで調べ、メンバーの順に表示する
+    # (1ファイルの -c では使わないので、ここで読み込む)
+    from concurrent.futures import ProcessPoolExecutor
+
+    try:
+        members = read_members(filepath)
+    except ElfError as e:
+        print(e)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(__member_props, [filepath] * len(members), members)
+        for i, (member, props) in enumerate(zip(members, results)):
+            if i:
+                print()
+            print(Color.boldify(f"{filepath}({member['name']}):"))
+            __print_props(props)
+
+
+def __print_props(props: Optional[Dict[str, Any]]):
+    if props is None:
+        print("PIE       : ", end="")
+        print(Color.highlightify(Color.redify("Not an ELF file")))
+        return
+    RELRO = props["relro"]
+    SSP = props["canary"]
+    NX = props["nx"]
+    PIE = props["pie"]
+
     print("RELRO     : ", end="")
     if RELRO == 0:
         print(Color.redify("No RELRO"))
@@ -84,4 +204,40 @@ def checksec(filepath):
     elif PIE == 3:
         print(Color.blueify("DSO"))
     elif PIE == 4:
-        print(Color.purplify("REL"))
\ No newline at end of file
+        print(Color.purplify("REL"))
+
+    print("FORTIFY   : ", end="")
+    counts = f"{len(props['fortified'])} fortified, {len(props['fortifiable'])} fortifiable"
+    if props["fortified"]:
+        print(Color.greenify(f"Yes ({counts})"))
+    elif props["fortifiable"]:
+        print(Color.redify(f"No ({counts})"))
+    else:
+        print(Color.normalify(f"N/A ({counts})"))
+
+    print("RPATH     : ", end="")
+    if props["rpath"]:
+        print(Color.redify(":".join(props["rpath"])))
+    else:
+        print(Color.greenify("No RPATH"))
+
+    print("RUNPATH   : ", end="")
+    if props["runpath"]:
+        print(Color.redify(":".join(props["runpath"])))
+    else:
+        print(Color.greenify("No RUNPATH"))
+
+    print("STRIPPED  : ", end="")
+    if props["stripped"]:
+        print(Color.greenify("Yes"))
+    else:
+        print(Color.yellowify("No"))
+
+    print("DEBUGINFO : ", end="")
+    if props["debug"]:
+        print(Color.yellowify("Yes"))
+    else:
+        print(Color.greenify("No"))
+
+    print("SYMBOLS   : ", end="")
+    print(f"{props['symbols']} symtab, {props['dynsyms']} dynsym")
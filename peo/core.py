@@ -1,16 +1,153 @@
+import re
+import sys
 import argparse
+from functools import partial
 
-from peo.disasm.disasm import disasm
-from peo.fhdr import fhdr
-from peo.checksec import checksec
-from peo.decompile import decompile
 
+def search_main(argv):
+    parser = argparse.ArgumentParser(
+        prog="peo search",
+        description="Search instruction sequences such as 'lea ; call .*strcpy'"
+    )
+    parser.add_argument("pattern")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument(
+        "-r",
+        "--recursive",
+        action="store_true",
+        help="Search every file under the given directories"
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="Number of parallel workers"
+    )
+
+    args = parser.parse_args(argv)
+
+    from peo.search import search
+    try:
+        search(args.pattern, args.paths, args.recursive, args.jobs)
+    except (ValueError, re.error) as e:
+        parser.error(str(e))
+
+
+def view_main(argv):
+    parser = argparse.ArgumentParser(
+        prog="peo view",
+        description="Browse the disassembly interactively"
+    )
+    parser.add_argument("file")
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=128,
+        help="Number of rendered functions to keep in memory"
+    )
+
+    args = parser.parse_args(argv)
+
+    from peo.view import view
+    view(args.file, args.cache_size)
+
+
+def export_main(argv):
+    parser = argparse.ArgumentParser(
+        prog="peo export",
+        description="Export functions, instructions, .rodata references and checksec results"
+    )
+    parser.add_argument(
+        "--sqlite",
+        required=True,
+        metavar="DB",
+        help="SQLite database to write into (created if missing)"
+    )
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument(
+        "-r",
+        "--recursive",
+        action="store_true",
+        help="Export every file under the given directories"
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="Number of parallel workers"
+    )
+
+    args = parser.parse_args(argv)
+
+    from peo.export import export_sqlite
+    export_sqlite(args.sqlite, args.paths, args.recursive, args.jobs)
+
+
+def strings_main(argv):
+    parser = argparse.ArgumentParser(
+        prog="peo strings",
+        description="Display the printable strings in .rodata and .data with their addresses"
+    )
+    parser.add_argument("file")
+    parser.add_argument(
+        "-n",
+        "--min-len",
+        type=int,
+        default=4,
+        metavar="N",
+        help="Display only the strings of at least N characters"
+    )
+    parser.add_argument(
+        "-j",
+        "--section",
+        action="append",
+        metavar="NAME",
+        help="Scan the section NAME instead of .rodata and .data (repeatable)"
+    )
+    parser.add_argument(
+        "--no-utf16",
+        action="store_true",
+        help="Do not look for UTF-16LE strings"
+    )
+    parser.add_argument(
+        "--format",
+        choices=["text", "jsonl"],
+        default="text",
+        help="Output format"
+    )
+
+    args = parser.parse_args(argv)
+    if args.min_len < 1:
+        parser.error("--min-len must be at least 1")
 
+    from peo.strings import strings, DEFAULT_SECTIONS
+    strings(args.file, args.section or DEFAULT_SECTIONS, args.min_len,
+            not args.no_utf16, args.format)
+
+
+# objdumpが失敗したら、そのエラー出力を表示して終了する
 def main():
+    from peo.util.error import ObjdumpError
+
+    try:
+        __main()
+    except ObjdumpError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+
+
+def __main():
+    # サブコマンド (peo search ...) はそれぞれのパーサに任せる
+    argv = sys.argv[1:]
+    if argv and argv[0] in subcommands:
+        subcommands[argv[0]](argv[1:])
+        return
+
     parser = argparse.ArgumentParser(
-        description="Python Extensions for objdump"
+        description="Python Extensions for objdump",
+        epilog="subcommands: " + ", ".join(f"peo {name} -h" for name in subcommands)
     )
-    parser.add_argument("file")  # 必須の引数
+    parser.add_argument("file", nargs="*")  # 必須の引数 (-fのみ複数可、--from-listingでは省略可)
     parser.add_argument(
         "-d",
         "--disassemble",
@@ -23,6 +160,18 @@ def main():
         action="store_true",  # フラグ
         help="Display the contents of the overall file header"
     )
+    parser.add_argument(
+        "-l",
+        "--program-headers",
+        action="store_true",
+        help="Display the program headers"
+    )
+    parser.add_argument(
+        "-S",
+        "--section-headers",
+        action="store_true",
+        help="Display the sections' header"
+    )
     parser.add_argument(
         "-c",
         "--checksec",
@@ -35,25 +184,168 @@ def main():
         help="Desplay the decompilation of executable"
     )
 
+    parser.add_argument(
+        "--diff",
+        action="store_true",
+        help="Display only the functions changed between OLD and NEW (peo --diff OLD NEW)"
+    )
+    parser.add_argument(
+        "--around",
+        metavar="ADDR",
+        help="Disassemble only the instructions around ADDR (address or symbol[+off])"
+    )
+    parser.add_argument(
+        "--context",
+        type=int,
+        default=16,
+        metavar="N",
+        help="Number of instructions shown before and after ADDR with --around"
+    )
+    parser.add_argument(
+        "--range",
+        metavar="START:END",
+        help="Disassemble only the addresses from START to END"
+    )
+    parser.add_argument(
+        "--max-arrow-depth",
+        type=int,
+        metavar="N",
+        help="Draw at most N columns of jump arrows and show deeper jumps as '\u2192 ADDR'"
+    )
+    parser.add_argument(
+        "--source",
+        action="store_true",
+        help="With -d, interleave source lines from the DWARF line table "
+             "(relative paths are resolved against DW_AT_comp_dir, "
+             "or the binary's directory if it is missing)"
+    )
+    parser.add_argument(
+        "--from-listing",
+        metavar="LISTING",
+        help="With -d, render a saved 'objdump -d -M intel' output instead of running objdump "
+             "('-' for stdin); the file is optional and only used for annotations"
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="With -d, re-render the changed functions whenever the file changes"
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=1.0,
+        help="Polling interval of --watch in seconds"
+    )
+    parser.add_argument(
+        "-r",
+        "--recursive",
+        action="store_true",
+        help="With -f, read every file under the given directories"
+    )
+    parser.add_argument(
+        "--format",
+        choices=["text", "table", "jsonl"],
+        help="Output format of -f (default: text for a single file, otherwise table)"
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="Number of parallel workers"
+    )
+
     args = parser.parse_args()
 
-    filepath = args.file  # ファイルのパス
+    if args.from_listing is not None:
+        if not args.disassemble:
+            parser.error("--from-listing requires -d")
+        if args.watch:
+            parser.error("--from-listing cannot be used with --watch")
+        if (args.around or args.range) and not args.file:  # アドレスを引くバイナリがない
+            parser.error("--around and --range need the binary file with --from-listing")
+    elif not args.file:
+        parser.error("the following arguments are required: file")
+    if args.diff:
+        if len(args.file) != 2:
+            parser.error("--diff takes exactly two files: OLD NEW")
+    elif len(args.file) > 1 and not args.file_headers:
+        parser.error("multiple files are only supported with -f")
+    if args.max_arrow_depth is not None and args.max_arrow_depth < 1:
+        parser.error("--max-arrow-depth must be at least 1")
+    if args.context < 0:
+        parser.error("--context must not be negative")
+    filepath = args.file[0] if args.file else None  # ファイルのパス
 
-    if args.disassemble:
+    # 各モードのモジュールは選ばれたときだけ読み込む (起動を軽くするため)
+    if args.diff:
+        from peo.diff import diff
+        diff(args.file[0], args.file[1])
+    elif args.around or args.range:
+        from peo.fhdr import ElfError
+        from peo.disasm.disasm import parse_addr, disasm_around, disasm_range
+        try:
+            if args.around:
+                disasm_around(filepath, parse_addr(filepath, args.around), args.context,
+                              args.max_arrow_depth, args.source)
+            else:
+                start, sep, stop = args.range.partition(":")
+                if not sep:
+                    parser.error("--range takes START:END")
+                start, stop = parse_addr(filepath, start), parse_addr(filepath, stop)
+                if stop <= start:
+                    parser.error("--range END must be after START")
+                disasm_range(filepath, start, stop, args.max_arrow_depth, args.source)
+        except (ValueError, ElfError) as e:
+            parser.error(str(e))
+    elif args.disassemble:
+        from peo.disasm.disasm import disasm, disasm_listing, watch
+        options = {"max_arrow_depth": args.max_arrow_depth, "source": args.source}
+        run = partial(disasm, jobs=args.jobs, **options)
+        if args.watch:
+            run = partial(watch, interval=args.interval, **options)
+        if args.from_listing is not None:
+            run = partial(disasm_listing, args.from_listing, **options)
+            if args.from_listing == "-":  # 標準入力は出力を読むのに使うので聞かない
+                run(filepath)
+                return
         fcn = input("Do you want to disassemble all functions? (Y/n/<fcn_name>): ")
         if fcn.upper() == "Y" or fcn == "":
-            disasm(filepath)
+            run(filepath)
         elif fcn.lower() == "n":
             pass
         else:
-            disasm(filepath, fcn)
+            run(filepath, fcn)
     elif args.file_headers:
-        fhdr(filepath)
+        from peo.fhdr import fhdr, fhdr_batch
+        fmt = args.format
+        if fmt is None:
+            batch = len(args.file) > 1 or args.recursive
+            fmt = "table" if batch else "text"
+        if fmt == "text" and len(args.file) == 1 and not args.recursive:
+            fhdr(filepath)
+        else:
+            fhdr_batch(args.file, args.recursive, fmt, args.jobs)
+    elif args.program_headers or args.section_headers:
+        from peo.fhdr import phdr, shdr
+        if args.program_headers:
+            phdr(filepath)
+        if args.section_headers:
+            shdr(filepath)
     elif args.checksec:
-        checksec(filepath)
+        from peo.checksec import checksec
+        checksec(filepath, args.jobs)
     elif args.decompile:
+        from peo.decompile import decompile
         decompile(filepath)
 
 
+subcommands = {
+    "search": search_main,
+    "view": view_main,
+    "export": export_main,
+    "strings": strings_main,
+}
+
+
 if __name__ == "__main__":
     main()
@@ -1,28 +1,15 @@
-import sys
-import subprocess as sp
 import re
 
 from collections import defaultdict
 
-from peo.util import format_message
+from peo.util import stream_objdump
 
 
 ParseError = TypeError, AssertionError, IndexError
 
 
 def decompile(filepath):
-    proc = sp.run(
-        ["objdump", "-d", "-M", "intel", filepath],
-        encoding="utf-8",
-        stdout=sp.PIPE,
-        stderr=sp.PIPE
-    )
-
-    if proc.returncode != 0:
-        print(proc.stderr)
-        sys.exit(1)
-
-    msgs = format_message(proc.stdout)
+    msgs = [msg for batch in stream_objdump(filepath) for msg in batch]
     operations = parse_operations(msgs)
 
     ops_main = operations['main']
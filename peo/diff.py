@@ -0,0 +1,145 @@
+import re
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from peo.util import Color, format_message, objdump, split_functions, fcn_bounds
+from peo.util import file_digest, load_cache, store_cache
+
+
+CACHE_KIND = "fhash-v2"
+
+_target = re.compile(r"(.*\s|)([0-9a-f]+) <([^>]*?)(\+0x[0-9a-f]+)?>$")
+_rip = re.compile(r"\[rip([+-])0x[0-9a-f]+\]")
+# アドレスかもしれない即値・ディスプレースメント
+# ([reg+0x..]・[reg-0x..] のようにベースレジスタからのオフセットのものは除く)
+_imm = re.compile(r"(?:^|(?<=[\s,:])|(?<=\*[1248]\+))0x([0-9a-f]+)")
+
+
+# アドレスに依存しない形に直す
+# 関数内へのジャンプは先頭からのオフセット、関数外は飛び先のシンボル名にする
+# resolverがあれば (実行ファイルのとき) セクションの中を指す即値もシンボル名にする
+def normalize(fcn_msgs: List[List[str]], resolver=None) -> List[str]:
+    start, end = fcn_bounds(fcn_msgs)
+    insts = []
+    for msg in fcn_msgs[1:]:
+        if len(msg) < 3:  # バイト列の続きだけの行
+            continue
+        inst = msg[2]
+        match = _target.match(inst)
+        if match:
+            target = int(match.group(2), 16)
+            if start <= target < end:
+                inst = f"{match.group(1)}.+{hex(target - start)}"
+            else:
+                inst = f"{match.group(1)}<{match.group(3)}>"
+        elif _rip.search(inst):
+            inst = _rip.sub("[rip+X]", inst)
+            if len(msg) >= 4:
+                ref = _target.match(msg[3])
+                if ref:
+                    inst += f" <{ref.group(3)}>"
+        elif resolver is not None and resolver.is_exec:
+            inst = _imm.sub(lambda m: __symbolize(resolver, m), inst)
+        insts.append(inst)
+    return insts
+
+
+# セクションの中を指す値はシンボル名 (なければセクション名) に オフセットは捨てる
+def __symbolize(resolver, match) -> str:
+    addr = int(match.group(1), 16)
+    if resolver.section_of(addr) is None:
+        return match.group(0)
+    label = resolver.resolve(addr)
+    return f"<{label.split('+')[0]}>"
+
+
+def hash_functions(msgs: List[List[str]], resolver=None) -> Dict[str, Dict[str, Any]]:
+    table = {}
+    for name, fcn_msgs in split_functions(msgs):
+        start, end = fcn_bounds(fcn_msgs)
+        digest = hashlib.sha1("\n".join(normalize(fcn_msgs, resolver)).encode()).hexdigest()
+        table[name] = {"hash": digest, "start": start, "end": end}
+    return table
+
+
+# 関数ハッシュ表を作る (ファイルの中身が同じならキャッシュを使う)
+# keep_msgsのときはobjdumpを実行した場合に限り、その結果も返す
+def __load(filepath: str, keep_msgs: bool) -> Tuple[Dict[str, Dict[str, Any]], Optional[List[List[str]]]]:
+    key = file_digest(filepath)
+    table = load_cache(CACHE_KIND, key)
+    if table is not None:
+        return table, None
+
+    from peo.resolver import build_resolver
+
+    msgs = format_message(objdump(filepath))
+    table = hash_functions(msgs, build_resolver(filepath))
+    store_cache(CACHE_KIND, key, table)
+    return table, msgs if keep_msgs else None
+
+
+def match_functions(old: Dict[str, Dict[str, Any]], new: Dict[str, Dict[str, Any]]) -> Dict[str, List]:
+    result = {"changed": [], "added": [], "removed": [], "renamed": [], "unchanged": []}
+
+    for name in new:
+        if name in old:
+            if old[name]["hash"] == new[name]["hash"]:
+                result["unchanged"].append(name)
+            else:
+                result["changed"].append(name)
+
+    # 名前で対応がつかなかったものはハッシュで対応させる
+    old_only = {old[n]["hash"]: n for n in old if n not in new}
+    for name in new:
+        if name in old:
+            continue
+        digest = new[name]["hash"]
+        if digest in old_only:
+            result["renamed"].append((old_only.pop(digest), name))
+        else:
+            result["added"].append(name)
+    result["removed"] = sorted(old_only.values(), key=lambda n: old[n]["start"])
+
+    return result
+
+
+def diff(oldpath: str, newpath: str):
+    from peo.disasm.disasm import render
+
+    # 2つのバイナリは別プロセスで同時に解析する
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        old_f = executor.submit(__load, oldpath, False)
+        new_f = executor.submit(__load, newpath, True)
+        old_table, _ = old_f.result()
+        new_table, new_msgs = new_f.result()
+
+    result = match_functions(old_table, new_table)
+
+    print(
+        f"Functions: {len(result['changed'])} changed, "
+        f"{len(result['added'])} added, {len(result['removed'])} removed, "
+        f"{len(result['renamed'])} renamed, {len(result['unchanged'])} unchanged"
+    )
+    for name in result["changed"]:
+        print(Color.yellowify(f"  [changed] {name}"))
+    for name in result["added"]:
+        print(Color.greenify(f"  [added]   {name}"))
+    for name in result["removed"]:
+        print(Color.redify(f"  [removed] {name}"))
+    for old_name, new_name in result["renamed"]:
+        print(Color.blueify(f"  [renamed] {old_name} -> {new_name}"))
+
+    targets = set(result["changed"]) | set(result["added"])
+    if not targets:
+        return
+
+    if new_msgs is None:  # キャッシュが効いたときはここで初めてobjdumpする
+        new_msgs = format_message(objdump(newpath))
+
+    msgs = []
+    for name, fcn_msgs in split_functions(new_msgs):
+        if name in targets:
+            msgs += fcn_msgs
+    print()
+    print("\n".join(render(newpath, msgs)))
@@ -1,4 +1,41 @@
-from peo.disasm.disasm import *
-from peo.disasm.arrow import *
-from peo.disasm.setcolor import *
-from peo.disasm.indent import *
+import sys
+import types
+import importlib
+
+
+# 公開する名前 -> 定義しているサブモジュール
+# サブモジュールは属性が参照されたときに初めて読み込む
+_names = {
+    "disasm": "disasm", "disasm_archive": "disasm", "render_member": "disasm",
+    "disasm_listing": "disasm", "render": "disasm", "render_batches": "disasm",
+    "parse_addr": "disasm", "disasm_range": "disasm", "disasm_around": "disasm",
+    "watch": "disasm",
+    "ArrowManager": "arrow", "flow_arrow": "arrow", "mark_outside": "arrow",
+    "jumper": "setcolor", "caller": "setcolor", "stacker": "setcolor", "calc": "setcolor",
+    "clr_func": "setcolor", "asem_color": "setcolor", "setcolor": "setcolor",
+    "load_palette": "setcolor", "arrow_clr": "setcolor",
+    "organize": "indent", "indent": "indent", "combine": "indent",
+    "RenderContext": "context",
+    "source_lines": "source", "pass_through": "source",
+}
+
+
+class _Package(types.ModuleType):
+    # サブモジュールを読み込むとimportの仕組みがパッケージの属性を上書きするので
+    # 同じ名前の関数 (disasm・setcolor・indent) はモジュールで上書きさせない
+    # (読み込んだ順番によらず、from peo.disasm import disasm は関数になる)
+    def __setattr__(self, name, value):
+        if name in _names and isinstance(value, types.ModuleType):
+            return
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
+
+
+def __getattr__(name):
+    if name in _names:
+        module = importlib.import_module(f"peo.disasm.{_names[name]}")
+        globals()[name] = getattr(module, name)
+        return globals()[name]
+    raise AttributeError(f"module 'peo.disasm' has no attribute '{name}'")
@@ -1,5 +1,5 @@
 import re
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 
 class ArrowManager:
@@ -63,7 +63,9 @@ class ArrowManager:
         return ret
 
 
-def flow_arrow(msgs: str) -> Tuple[List[str], List[List[int]]]:
+# max_depthを指定すると、それより外側の列になる矢印は張らずに
+# ジャンプ元の行に飛び先 (→ 0x4011a0) を書く
+def flow_arrow(msgs: str, max_depth: Optional[int]=None) -> Tuple[List[str], List[List[int]]]:
     retarrows = []
     retcolors = []
     insts = []
@@ -72,25 +74,26 @@ def flow_arrow(msgs: str) -> Tuple[List[str], List[List[int]]]:
             insts.append(msgs[i])
         else:
             if insts:
-                newarrows, newcolors = __arrowing_in_func(insts)
+                newarrows, newcolors = __arrowing_in_func(insts, max_depth)
                 retarrows += newarrows
                 retcolors += newcolors
                 insts = []
             retarrows.append('')
             retcolors.append([])
     if insts:
-        newarrows, newcolors = __arrowing_in_func(insts)
+        newarrows, newcolors = __arrowing_in_func(insts, max_depth)
         retarrows += newarrows
         retcolors += newcolors
 
     return (retarrows, retcolors)
 
 
-def __arrowing_in_func(insts: str) -> Tuple[List[str], List[List[int]]]:
+def __arrowing_in_func(insts: str, max_depth: Optional[int]=None) -> Tuple[List[str], List[List[int]]]:
     # 基本的に逆から見ていく  矢印終点に辿り着いたら始点まで戻る形で矢を張る
     # 矢を張る区間内で、他の矢と重ならない最も内側の列に矢を張る
 
     arrowM = ArrowManager(len(insts))
+    collapsed = []  # 列が足りず張らなかった矢印の始点
     # 下から上への矢印を処理
     e2b = dict()
     for i in range(len(insts)-1, -1, -1):
@@ -98,6 +101,9 @@ def __arrowing_in_func(insts: str) -> Tuple[List[str], List[List[int]]]:
         if addr in e2b:
             for st in e2b[addr]:
                 depth, rcolor = arrowM.min_empty_col(i, st)
+                if max_depth is not None and depth > max_depth:
+                    collapsed.append(st)
+                    continue
                 arrowM.add_arrow(st, i, depth, rcolor)
             e2b[addr] = []
 
@@ -122,6 +128,9 @@ def __arrowing_in_func(insts: str) -> Tuple[List[str], List[List[int]]]:
         if addr in e2b:
             for st in e2b[addr]:
                 depth, rcolor = arrowM.min_empty_col(st, i)
+                if max_depth is not None and depth > max_depth:
+                    collapsed.append(st)
+                    continue
                 arrowM.add_arrow(st, i, depth, rcolor)
             e2b[addr] = []
 
@@ -139,6 +148,25 @@ def __arrowing_in_func(insts: str) -> Tuple[List[str], List[List[int]]]:
         else:
             e2b[opr] = [i]
 
+    for st in sorted(collapsed):
+        insts[st].append(f"; \u2192 0x{insts[st][2].split()[1]}")
+
     newarrows = [''.join(row) for row in arrowM.get_arrows()]
     newcolors = arrowM.get_colors()
     return (newarrows, newcolors)
+
+
+# 表示している範囲 [lo, hi) の外へ出るジャンプに印をつける
+def mark_outside(msgs: List[List[str]], lo: int, hi: int) -> List[List[str]]:
+    for msg in msgs:
+        if len(msg) < 3 or not re.match("[0-9a-f]+:", msg[0]):
+            continue
+        opc, *opr = msg[2].split()
+        if opc[0] != 'j' or not opr or re.match('^[0-9a-f]+$', opr[0]) is None:
+            continue
+        target = int(opr[0], 16)
+        if target < lo:
+            msg.append(f"; ↑ {hex(target)} (outside)")
+        elif target >= hi:
+            msg.append(f"; ↓ {hex(target)} (outside)")
+    return msgs
@@ -1,22 +1,35 @@
-from typing import List
+import re
+from typing import List, Optional
 
 from peo.util import get_section_as_str
 
 
+# アドレスとして使われる即値: mov reg, imm / push imm / ベースレジスタのない ds:disp
+# ([reg±disp] のdispはオフセットなので見ない)
+_abs_addr = re.compile(r"^mov\s+[a-z0-9]+,0x([0-9a-f]+)$|^push\s+0x([0-9a-f]+)$|\bds:0x([0-9a-f]+)")
+
+
 class Comment:
-    def __init__(self, filepath: str, msgs: List[List[str]]):
+    def __init__(self, filepath: Optional[str], msgs: List[List[str]], resolver=None, strings=None):
         self.filepath = filepath
         self.msgs = msgs
+        self.resolver = resolver
+        self.strings = strings  # peo.strings.StringTable (なければobjdumpで読む)
 
     def lea_rodata(self):
+        if self.filepath is None:  # バイナリがない (保存した出力を表示するとき)
+            return
         for i, msg in enumerate(self.msgs):
             try:
-                if "lea" in msg[2]:
+                if "lea" in msg[2] and not msg[3].startswith(";"):
                     addr = int(msg[3].split(" ")[0], 16)
 
-                    plain_str = repr(
-                        get_section_as_str(self.filepath, '.rodata', addr)
-                    )
+                    if self.strings is not None:
+                        plain_str = repr(self.strings.at(addr) or "")
+                    else:
+                        plain_str = repr(
+                            get_section_as_str(self.filepath, '.rodata', addr)
+                        )
 
                     self.msgs[i][3] = f"; {hex(addr)} ; {plain_str}"
             except IndexError:
@@ -54,7 +67,47 @@ class Comment:
             except ValueError:
                 pass
 
+    # RIP相対の参照先・GOTのスロット・即値のアドレス・再配置にシンボル名をつける
+    # .rodataを指すleaはlea_rodataで文字列にする
+    def symbols(self):
+        if self.resolver is None:
+            return
+        for i, msg in enumerate(self.msgs):
+            if len(msg) < 3 or not re.match("[0-9a-f]+:", msg[0]):
+                continue
+            if len(msg) >= 4 and msg[3].startswith(";"):
+                continue
+
+            target = None
+            label = None
+            if self.resolver.relocs:  # 再配置可能ファイル
+                addr = int(msg[0][:-1], 16)
+                label = self.resolver.reloc_in(addr, addr + len(msg[1].split()))
+            elif "rip" in msg[2] and len(msg) >= 4:
+                match = re.match("[0-9a-f]+", msg[3])
+                if match:
+                    target = int(match.group(0), 16)
+                    if "lea" in msg[2] and self.resolver.section_of(target) == ".rodata":
+                        continue
+                    label = self.resolver.resolve(target)
+            elif self.resolver.is_exec:  # PIEの即値はアドレスではない
+                match = _abs_addr.search(msg[2])
+                if match:
+                    addr = int(next(g for g in match.groups() if g), 16)
+                    if self.resolver.section_of(addr) is not None:
+                        target = addr
+                        label = self.resolver.resolve(addr)
+
+            if label is None:
+                continue
+            note = f"; {hex(target)} <{label}>" if target is not None else f"; <{label}>"
+            if len(msg) >= 4:
+                self.msgs[i][3] = note
+            else:
+                self.msgs[i].append(note)
+
     def add(self) -> List[List[str]]:
+        self.symbols()
         self.lea_rodata()
         self.movabs()
         self.mov_word()
@@ -0,0 +1,53 @@
+from typing import Any, Dict, Optional
+
+from peo.disasm.setcolor import load_palette
+
+
+# 1回の表示(または1つのビューア)で使う状態をまとめる
+# モジュールの変数に持たないので、同じプロセスで何度でも・並行しても呼べる
+class RenderContext:
+    def __init__(self, filepath: Optional[str], palette: Optional[Dict[Any, Any]]=None,
+                 max_arrow_depth: Optional[int]=None, source: bool=False):
+        self.filepath = filepath
+        self.palette = palette if palette is not None else load_palette()
+        self.max_arrow_depth = max_arrow_depth  # 矢印を張る列の数の上限
+        self.source = source  # ソースの行を差し込むか
+        self._resolver = None
+        self._resolver_built = False
+        self._strings = None
+        self._strings_built = False
+        self._line_table = None
+        self._line_table_built = False
+
+    # アドレス -> シンボルの表はバイナリごとに一度だけ作る
+    @property
+    def resolver(self):
+        if not self._resolver_built and self.filepath is not None:
+            from peo.resolver import build_resolver
+            self._resolver = build_resolver(self.filepath)
+            self._resolver_built = True
+        return self._resolver
+
+    # .rodata/.data の文字列の表 (peo stringsと同じ走査) も一度だけ作る
+    @property
+    def strings(self):
+        if not self._strings_built and self.filepath is not None:
+            from peo.strings import build_strings
+            self._strings = build_strings(self.filepath)
+            self._strings_built = True
+        return self._strings
+
+    # 注釈に使う表 (シンボル・文字列・ソースの行) のハッシュ
+    # 命令のバイト列と合わせれば、描画した結果が同じかどうかがわかる
+    def digest(self) -> str:
+        tables = [self.resolver, self.strings, self.line_table if self.source else None]
+        return ":".join(t.digest() if t is not None else "" for t in tables)
+
+    # DWARFの行番号表 (ディスクにキャッシュする)
+    @property
+    def line_table(self):
+        if not self._line_table_built and self.filepath is not None:
+            from peo.dwarf import load_lines
+            self._line_table = load_lines(self.filepath)
+            self._line_table_built = True
+        return self._line_table
@@ -1,55 +1,327 @@
+import os
+import re
 import sys
-import subprocess as sp
-from typing import Optional
-from pprint import pprint
+import time
+import hashlib
+from typing import Dict, Iterable, List, Optional, Tuple
 
-from peo.util import format_message
+from peo.util import Color, format_message, objdump, stream_objdump, split_functions
+from peo.util import ObjdumpError, read_listing
 from peo.disasm.comment import Comment
-from peo.disasm.arrow import flow_arrow
+from peo.disasm.arrow import flow_arrow, mark_outside
 from peo.disasm.setcolor import setcolor, arrow_clr
 from peo.disasm.indent import organize, indent, combine
+from peo.disasm.source import source_lines, pass_through
+from peo.disasm.context import RenderContext
 
 
-def disasm(filepath: str, fcn: Optional[str]=None):
-    proc = sp.run(
-        ["objdump", "-d", "-M", "intel", filepath],
-        encoding="utf-8",
-        stdout=sp.PIPE,
-        stderr=sp.PIPE
-    )
+def disasm(filepath: str, fcn: Optional[str]=None, max_arrow_depth: Optional[int]=None,
+           jobs: Optional[int]=None, source: bool=False):
+    from peo.archive import is_archive
+
+    if is_archive(filepath):
+        disasm_archive(filepath, fcn, max_arrow_depth, jobs, source)
+        return
 
     # objdumpがエラーを出したらやめるっピ
-    if proc.returncode != 0:
-        print(proc.stderr)
-        sys.exit(1)
-
-    msgs = format_message(proc.stdout)
-
-    # 関数名をしていした場合はそこだけ抜き出す
-    if fcn is not None:
-        tmp = []
-        fcn_flag = False  # その関数内のときTrue
-        for msg in msgs:
-            if len(msg) == 1:
-                if f"<{fcn}>" in msg[0]:
-                    fcn_flag = True
-                else:
-                    fcn_flag = False
-            if fcn_flag:
-                tmp.append(msg)
-        msgs = tmp
-
-    msgs = Comment(filepath, msgs).add()
-    msgs = organize(msgs)
+    batches = __select(stream_objdump(filepath), fcn)
+
+    ctx = RenderContext(filepath, max_arrow_depth=max_arrow_depth, source=source)
+    print("\n".join(render_batches(filepath, batches, ctx=ctx)))
+
+
+# アーカイブ(.a)はメンバーごとに別プロセスで逆アセンブルし、メンバーの順に表示する
+def disasm_archive(filepath: str, fcn: Optional[str]=None,
+                   max_arrow_depth: Optional[int]=None, jobs: Optional[int]=None,
+                   source: bool=False):
+    from concurrent.futures import ProcessPoolExecutor
+    from peo.archive import read_members
+    from peo.fhdr import ElfError
+
+    try:
+        members = read_members(filepath)
+    except ElfError as e:
+        print(e)
+        return
+    print(f"In archive {filepath}:")
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(
+            render_member, [filepath] * len(members), members,
+            [fcn] * len(members), [max_arrow_depth] * len(members),
+            [source] * len(members)
+        )
+        for member, (lines, error) in zip(members, results):
+            if error is not None:
+                print(f"{filepath}({member['name']}): {error}", file=sys.stderr)
+            elif lines:
+                print()
+                print("\n".join(lines))
+
+
+# アーカイブのメンバーを1つ描画する (ワーカープロセスで動く)
+# 取り出したメンバーはディスクに書かず、メモリ上のファイルとしてobjdumpに渡す
+def render_member(filepath: str, member: Dict, fcn: Optional[str]=None,
+                  max_arrow_depth: Optional[int]=None,
+                  source: bool=False) -> Tuple[List[str], Optional[str]]:
+    from peo.archive import read_member, member_path
+    from peo.fhdr import ElfError, parse_fhdr
+
+    data = read_member(filepath, member)
+    try:
+        parse_fhdr(data[:64])
+    except ElfError as e:
+        return [], str(e)
+
+    with member_path(data, member["name"]) as path:
+        try:
+            batches = list(__select(stream_objdump(path), fcn))
+        except ObjdumpError as e:
+            return [], str(e)
+        ctx = RenderContext(path, max_arrow_depth=max_arrow_depth, source=source)
+        lines = render_batches(path, batches, ctx=ctx)
+    # 見出しのパスを "アーカイブ(メンバー)" にする
+    name = f"{filepath}({member['name']})"
+    return [line.replace(path, name) for line in lines], None
+
+
+# objdumpを実行せず、保存しておいた出力を表示する
+# バイナリ(filepath)がないときはシンボル名・.rodataの注釈をつけない
+def disasm_listing(listing: str, filepath: Optional[str]=None, fcn: Optional[str]=None,
+                   max_arrow_depth: Optional[int]=None, source: bool=False):
+    batches = __select(read_listing(listing), fcn)
+
+    # 関数ごとに描画してすぐ表示する (view・watchと同じ) ので、大きな出力でも全体を持たない
+    # 矢印の幅と列のそろえ方は関数ごとになる
+    ctx = RenderContext(filepath, max_arrow_depth=max_arrow_depth, source=source)
+    blank = False  # 前の関数の後に空行を入れるか
+    headers = []  # 見出しだけのまとまり (ファイル形式・セクション) は次の関数と一緒に描く
+    for batch in batches:
+        if all(len(msg) == 1 for msg in batch):
+            headers += batch
+            continue
+        batch = headers + batch
+        headers = []
+        if blank:
+            sys.stdout.write("\n")
+        blank = len(batch[-1]) != 1
+        lines = render_batches(filepath, [batch], ctx=ctx)
+        if lines:
+            sys.stdout.write("\n".join(lines) + "\n")
+
+
+# 関数名をしていした場合はそこだけ抜き出す
+def __select(batches: Iterable[List[List[str]]], fcn: Optional[str]) -> Iterable[List[List[str]]]:
+    if fcn is None:
+        return batches
+    return (
+        batch for batch in batches
+        if len(batch[0]) == 1 and f"<{fcn}>" in batch[0][0]
+    )
+
+
+# 注釈・矢印・色をつけて表示する行にする
+# windowを指定すると、その範囲の外へのジャンプに印をつける
+def render(filepath: Optional[str], msgs: List[List[str]],
+           window: Optional[Tuple[int, int]]=None,
+           ctx: Optional[RenderContext]=None) -> List[str]:
+    return render_batches(filepath, [msgs], window, ctx)
+
+
+# 注釈と矢印は関数ごとに決まるので、まとまりが届くたびに処理しておく
+# 幅をそろえる処理と色づけは全部そろってから行う
+def render_batches(filepath: Optional[str], batches: Iterable[List[List[str]]],
+                   window: Optional[Tuple[int, int]]=None,
+                   ctx: Optional[RenderContext]=None) -> List[str]:
+    if ctx is None:
+        ctx = RenderContext(filepath)
+    msgs = []
+    arrows = []
+    arrowcolors = []
+    for batch in batches:
+        batch = Comment(ctx.filepath, batch, ctx.resolver, ctx.strings).add()
+        if window is not None:
+            batch = mark_outside(batch, *window)
+        newarrows, newcolors = flow_arrow(batch, ctx.max_arrow_depth)
+        msgs += batch
+        arrows += newarrows
+        arrowcolors += newcolors
+    if not msgs:  # 表示するものがない (関数が見つからない・空の出力)
+        return []
+
+    # ソースの行は矢印を張ったあとに、命令の前へ差し込む
+    sources = {}
+    if ctx.source and ctx.line_table is not None:
+        sources = source_lines(msgs, ctx.line_table)
+        for i in sources:
+            arrow, color = pass_through(arrows, arrowcolors, i)
+            arrow = arrow_clr([arrow], [color], ctx.palette)[0]
+            sources[i] = arrow + " " + ctx.palette["source"](sources[i])
 
-    arrows, arrowcolors = flow_arrow(msgs)
-    indent(arrows, msgs)
-    clr_arrows = arrow_clr(arrows, arrowcolors)
-    msgs = setcolor(msgs)
-    perf_msgs = combine(clr_arrows, msgs)
+    msgs = organize(msgs)
+    space = indent(arrows, msgs)
+    clr_arrows = arrow_clr(arrows, arrowcolors, ctx.palette)
+    msgs = setcolor(msgs, ctx.palette)
+    perf_msgs = combine(clr_arrows, msgs, space)
 
+    lines = []
     for i in range(len(perf_msgs)):
-        print("   ".join(msgs[i]))
+        if i in sources:
+            lines.append(" " * space[i] + sources[i])
+        lines.append("   ".join(msgs[i]))
         if len(msgs[i]) != 1 and i+1 != len(msgs):
             if len(msgs[i+1]) == 1:
-                print()
+                lines.append("")
+    return lines
+
+
+# "0x401136", "401136", "main", "main+0x1d" のどれかをアドレスにする
+def parse_addr(filepath: str, text: str) -> int:
+    from peo.elf import ELF
+
+    match = re.match(r"^([^+]+?)(?:\+(0x[0-9a-fA-F]+|[0-9]+))?$", text.strip())
+    if match:
+        with ELF(filepath) as elf:
+            addr = elf.symbol_addr(match.group(1))
+        if addr is not None:
+            return addr + int(match.group(2) or "0", 0)
+    try:
+        return int(text, 16)
+    except ValueError:
+        pass
+    raise ValueError(f"cannot resolve address: {text}")
+
+
+def disasm_range(filepath: str, start: int, stop: int, max_arrow_depth: Optional[int]=None,
+                 source: bool=False):
+    msgs = format_message(objdump(
+        filepath, f"--start-address={hex(start)}", f"--stop-address={hex(stop)}"
+    ))
+    ctx = RenderContext(filepath, max_arrow_depth=max_arrow_depth, source=source)
+    print("\n".join(render(filepath, msgs, (start, stop), ctx)))
+
+
+# addrの前後context命令だけ表示する
+def disasm_around(filepath: str, addr: int, context: int=16,
+                  max_arrow_depth: Optional[int]=None, source: bool=False):
+    from peo.elf import ELF
+
+    # x86の命令は後ろから区切れないので、含まれる関数の先頭から逆アセンブルする
+    with ELF(filepath) as elf:
+        sym = elf.function_at(addr)
+        if sym is not None:
+            start = sym["st_value"]
+            stop = min(elf.function_end(sym), addr + 15 * (context+1))
+        else:
+            start = addr
+            stop = addr + 15 * (context+1)
+
+    msgs = format_message(objdump(
+        filepath, f"--start-address={hex(start)}", f"--stop-address={hex(stop)}"
+    ))
+
+    # 命令ごとに(続きの行も含めて)まとめる
+    header = []
+    groups = []
+    for msg in msgs:
+        if re.match("[0-9a-f]+:", msg[0]):
+            if len(msg) >= 3 or not groups:
+                groups.append([msg])
+            else:
+                groups[-1].append(msg)
+        elif not groups:
+            header.append(msg)
+    ctx = RenderContext(filepath, max_arrow_depth=max_arrow_depth, source=source)
+    if not groups:
+        print("\n".join(render(filepath, msgs, ctx=ctx)))
+        return
+
+    addrs = [int(group[0][0][:-1], 16) for group in groups]
+    p = max([i for i, a in enumerate(addrs) if a <= addr] or [0])
+    groups = groups[max(0, p-context):p+context+1]
+
+    lo = int(groups[0][0][0][:-1], 16)
+    last = groups[-1]
+    hi = int(last[0][0][:-1], 16) + sum(len(msg[1].split()) for msg in last)
+
+    msgs = header + [msg for group in groups for msg in group]
+    print("\n".join(render(filepath, msgs, (lo, hi), ctx)))
+
+
+# ファイルが更新されるたびに表示し直す 中身の変わっていない関数は前回の結果を使う
+def watch(filepath: str, fcn: Optional[str]=None, interval: float=1.0,
+          max_arrow_depth: Optional[int]=None, source: bool=False):
+    ctx = RenderContext(filepath, max_arrow_depth=max_arrow_depth, source=source)
+    rendered = {}  # 関数の中身のハッシュ -> 表示する行
+    digests = None  # 関数名 -> ハッシュ (前回の分)
+    last = None
+    pending = None
+    try:
+        while True:
+            try:
+                st = os.stat(filepath)
+                stamp = (st.st_mtime_ns, st.st_size)
+            except FileNotFoundError:  # ビルドの途中
+                stamp = None
+
+            # 書き込みの途中で読まないよう、interval空けて2回続けて同じだったら読む
+            if stamp is not None and stamp != last:
+                if stamp == pending:
+                    last = stamp
+                    # シンボル・文字列・行番号の表は新しいバイナリから作り直す (配色はそのまま)
+                    ctx = RenderContext(filepath, ctx.palette, ctx.max_arrow_depth, ctx.source)
+                    try:
+                        msgs = format_message(objdump(filepath))
+                    except ObjdumpError as e:
+                        print(e, file=sys.stderr)
+                        print(Color.redify("objdump failed, waiting for the next change"))
+                    else:
+                        digests, rendered = __rerender(ctx, msgs, fcn, digests, rendered)
+                    sys.stdout.flush()
+                pending = stamp
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+
+
+def __rerender(ctx: RenderContext, msgs: List[List[str]], fcn: Optional[str],
+               old_digests: Optional[Dict[str, str]], old_rendered: Dict[str, List[str]]):
+    digests = {}
+    rendered = {}
+    lines = []
+    changed = []
+    tables = ctx.digest()  # 再ビルドごとに一度だけ
+    for name, fcn_msgs in split_functions(msgs):
+        if fcn is not None and name != fcn:
+            continue
+        # 関数のアドレスとバイト列、注釈に使う表のハッシュ
+        # (位置がずれた関数や、参照している文字列などが変わった関数は描き直す)
+        code = "\n".join(f"{msg[0]}{msg[1]}" for msg in fcn_msgs if len(msg) >= 2)
+        digest = hashlib.sha1(f"{name}\n{tables}\n{code}".encode()).hexdigest()
+        digests[name] = digest
+        if digest in old_rendered:
+            rendered[digest] = old_rendered[digest]
+        else:
+            rendered[digest] = render(ctx.filepath, [list(msg) for msg in fcn_msgs], ctx=ctx)
+            changed.append(name)
+        lines += rendered[digest] + [""]
+
+    if sys.stdout.isatty():
+        print("\033[2J\033[H", end="")  # 画面を消す
+    print("\n".join(lines))
+
+    if old_digests is None:
+        print(Color.greenify(f"[watch] {len(digests)} functions rendered"))
+        return digests, rendered
+
+    added = [name for name in changed if name not in old_digests]
+    modified = [name for name in changed if name in old_digests]
+    removed = [name for name in old_digests if name not in digests]
+    print(Color.greenify(
+        f"[watch] {time.strftime('%H:%M:%S')} "
+        f"{len(modified)} changed, {len(added)} added, {len(removed)} removed, "
+        f"{len(digests) - len(changed)} reused"
+    ))
+    for label, names in (("changed", modified), ("added", added), ("removed", removed)):
+        if names:
+            print(Color.yellowify(f"  {label}: {', '.join(names)}"))
+    return digests, rendered
@@ -1,9 +1,6 @@
 from typing import List
 
 
-space = []
-
-
 def organize(msgs: List[List[str]]) -> List[List[str]]:
     max_size = max(
         [len(msgs[i][1]) for i in range(len(msgs)) if len(msgs[i]) >= 2]
@@ -22,8 +19,9 @@ def organize(msgs: List[List[str]]) -> List[List[str]]:
     return msgs
 
 
-def indent(arrows: List[str], msgs: List[List[str]]):
-    global space
+# 各行の矢印の前に入れる空白の数
+def indent(arrows: List[str], msgs: List[List[str]]) -> List[int]:
+    space = []
     max_size = max(len(arrow) for arrow in arrows)
     for i in range(len(msgs)):
         if len(msgs[i]) == 1:
@@ -31,9 +29,10 @@ def indent(arrows: List[str], msgs: List[List[str]]):
         else:
             l = max_size - len(arrows[i])
         space.append(l)
+    return space
 
 
-def combine(arrows: List[str], msgs: List[List[str]]) -> List[List[str]]:
+def combine(arrows: List[str], msgs: List[List[str]], space: List[int]) -> List[List[str]]:
     for i in range(len(msgs)):
         msgs[i][0] = " " * space[i] + arrows[i] + " " + msgs[i][0]
 
@@ -29,11 +29,11 @@ clr_func = {
     "bg_white": Color.bg_whiteify
 }
 
-# 配色辞書
+# 配色辞書 (既定値 書き換えずにload_paletteでコピーして使う)
 asem_color = {
     "jumper": Color.yellowify, "caller": Color.redify,
     "stacker": Color.purplify, "calc": Color.blueify,
-    "other": Color.normalify, "func": Color.greenify,
+    "other": Color.normalify, "func": Color.greenify, "source": Color.cyanify,
     0: Color.normalify, 1: Color.redify, 2: Color.yellowify,
     3: Color.greenify, 4: Color.blueify, 5: Color.purplify,
     6: Color.cyanify, 7: Color.blackify
@@ -41,69 +41,72 @@ asem_color = {
 
 
 # 必要なアセンブラ部と命令部の取り出し
-def setcolor(msgs):
-    __make_dict()
+def setcolor(msgs, palette=None):
+    if palette is None:
+        palette = load_palette()
     for i in range(len(msgs)):
-        if len(msgs[i]) == 4:
-            if msgs[i][3][0] == ';':
-                msgs[i][3] = Color.greenify(msgs[i][3])
-            else:
-                msg = msgs[i][2].split(" ")
-                msgs[i][2] = __inner_setcolor(msgs[i][2], msg)
-
-        elif len(msgs[i]) == 3:
+        if len(msgs[i]) >= 3:
             msg = msgs[i][2].split(" ")
-            msgs[i][2] = __inner_setcolor(msgs[i][2], msg)
+            msgs[i][2] = __inner_setcolor(msgs[i][2], msg, palette)
+            # 注釈 (";"で始まるもの) は命令の後ろにいくつあってもすべて緑にする
+            for j in range(3, len(msgs[i])):
+                if msgs[i][j][:1] == ';':
+                    msgs[i][j] = Color.greenify(msgs[i][j])
 
         elif len(msgs[i]) == 1:
             if "<" in msgs[i][0]:
-                msgs[i][0] = asem_color["func"](msgs[i][0])
-                msgs[i+1][0] = asem_color["func"](msgs[i+1][0])
+                msgs[i][0] = palette["func"](msgs[i][0])
+                msgs[i+1][0] = palette["func"](msgs[i+1][0])
 
     return msgs
 
 
-# ユーザー定義の配色に
-def __make_dict():
-    global asem_color
+# ユーザー定義の配色に (呼び出しごとに新しい辞書を返す)
+def load_palette():
+    palette = dict(asem_color)
     try:
         with open(os.path.join(os.environ['HOME'], ".peorc"), 'r') as d:
             set_c = [s.replace("\n", "").split(" ") for s in d.readlines()]
 
         for i in range(len(set_c)):
+            if len(set_c[i]) < 3:
+                continue
             key = set_c[i][0]
             clr = set_c[i][2]
             user_f = clr_func[clr]
-            asem_color[key] = user_f
-    except FileNotFoundError:
+            palette[key] = user_f
+    except (FileNotFoundError, KeyError):
         pass
+    return palette
 
 
 # 配色と適用
-def __inner_setcolor(msgs, msg):
+def __inner_setcolor(msgs, msg, palette):
     if msg[0] in jumper:
-        c_msgs = asem_color["jumper"](msgs)
+        c_msgs = palette["jumper"](msgs)
 
     elif msg[0] in caller:
-        c_msgs = asem_color["caller"](msgs)
+        c_msgs = palette["caller"](msgs)
 
     elif msg[0] in stacker:
-        msg[0] = asem_color["stacker"](msg[0])
+        msg[0] = palette["stacker"](msg[0])
         c_msgs = ' '.join(msg)
 
     elif msg[0] in calc:
-        msg[0] = asem_color["calc"](msg[0])
+        msg[0] = palette["calc"](msg[0])
         c_msgs = ' '.join(msg)
 
     else:
-        msg[0] = asem_color["other"](msg[0])
+        msg[0] = palette["other"](msg[0])
         c_msgs = ' '.join(msg)
 
     return c_msgs
 
 
 # 矢印に色をつける
-def arrow_clr(arrows, clr_nums):
+def arrow_clr(arrows, clr_nums, palette=None):
+    if palette is None:
+        palette = load_palette()
     for i, clr_num in zip(range(len(arrows)), clr_nums):
         if len(arrows[i]) != 0:
             split_arrow = []
@@ -112,7 +115,7 @@ def arrow_clr(arrows, clr_nums):
 
             for s in range(len(split_arrow)):
                 key = clr_num[s] % 8
-                split_arrow[s] = asem_color[key](split_arrow[s])
+                split_arrow[s] = palette[key](split_arrow[s])
             arrows[i] = ''.join(split_arrow)
 
     return arrows
\ No newline at end of file
@@ -0,0 +1,43 @@
+import os
+import re
+from typing import Dict, List, Tuple
+
+
+# 関数の先頭と、ソースの行が変わる命令の前に入れる行 (行の番号 -> 表示する文字列)
+# 命令ごとに行番号表を二分探索で引くだけで、objdump -S は使わない
+def source_lines(msgs: List[List[str]], table) -> Dict[int, str]:
+    ret = {}
+    last = None
+    for i, msg in enumerate(msgs):
+        if len(msg) == 1:  # 関数・セクションの見出し
+            last = None
+            continue
+        if len(msg) < 3 or not re.match("[0-9a-f]+:", msg[0]):
+            continue
+        loc = table.lookup(int(msg[0][:-1], 16))
+        if loc is None or loc == last:
+            continue
+        last = loc
+        path, line = loc
+        code = table.source(path, line)
+        text = f"{os.path.basename(path)}:{line}"
+        if code is not None and code.strip():
+            text += f"  {code.strip()}"
+        ret[i] = text
+    return ret
+
+
+# i行目の命令の直前に入れる行の矢印 (上下の行をつなぐ縦線だけ残す)
+def pass_through(arrows: List[str], colors: List[List[int]], i: int) -> Tuple[str, List[int]]:
+    below = arrows[i]
+    above = arrows[i-1] if i > 0 and len(arrows[i-1]) == len(below) else " " * len(below)
+    arrow = []
+    color = []
+    for j in range(len(below)):
+        if above[j] in "│┌" and below[j] in "│└":
+            arrow.append("│")
+            color.append(colors[i][j])
+        else:
+            arrow.append(" ")
+            color.append(0)
+    return "".join(arrow), color
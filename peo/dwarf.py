@@ -0,0 +1,465 @@
+import os
+import bisect
+import struct
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from peo.elf import ELF, cstring
+from peo.fhdr import EType, ElfError
+from peo.util import file_digest, load_cache, store_cache
+
+
+CACHE_KIND = "lines-v2"
+
+# 標準オペコード
+DW_LNS_copy = 0x01
+DW_LNS_advance_pc = 0x02
+DW_LNS_advance_line = 0x03
+DW_LNS_set_file = 0x04
+DW_LNS_const_add_pc = 0x08
+DW_LNS_fixed_advance_pc = 0x09
+
+# 拡張オペコード
+DW_LNE_end_sequence = 0x01
+DW_LNE_set_address = 0x02
+DW_LNE_define_file = 0x03
+
+# DWARF 5 のディレクトリ・ファイル表の項目と形式
+DW_LNCT_path = 0x01
+DW_LNCT_directory_index = 0x02
+
+# コンパイル単位の属性 (.debug_info)
+DW_AT_stmt_list = 0x10
+DW_AT_comp_dir = 0x1b
+DW_UT_type = 0x02
+DW_UT_skeleton = 0x04
+DW_UT_split_compile = 0x05
+DW_UT_split_type = 0x06
+
+DW_FORM_addr = 0x01
+DW_FORM_block2 = 0x03
+DW_FORM_block4 = 0x04
+DW_FORM_flag = 0x0c
+DW_FORM_sdata = 0x0d
+DW_FORM_ref_addr = 0x10
+DW_FORM_ref1 = 0x11
+DW_FORM_ref2 = 0x12
+DW_FORM_ref4 = 0x13
+DW_FORM_ref8 = 0x14
+DW_FORM_ref_udata = 0x15
+DW_FORM_indirect = 0x16
+DW_FORM_sec_offset = 0x17
+DW_FORM_exprloc = 0x18
+DW_FORM_flag_present = 0x19
+DW_FORM_addrx = 0x1b
+DW_FORM_ref_sup4 = 0x1c
+DW_FORM_strp_sup = 0x1d
+DW_FORM_ref_sig8 = 0x20
+DW_FORM_implicit_const = 0x21
+DW_FORM_loclistx = 0x22
+DW_FORM_rnglistx = 0x23
+DW_FORM_ref_sup8 = 0x24
+DW_FORM_addrx1 = 0x29
+DW_FORM_addrx2 = 0x2a
+DW_FORM_addrx3 = 0x2b
+DW_FORM_addrx4 = 0x2c
+DW_FORM_block = 0x09
+DW_FORM_block1 = 0x0a
+DW_FORM_data1 = 0x0b
+DW_FORM_data2 = 0x05
+DW_FORM_data4 = 0x06
+DW_FORM_data8 = 0x07
+DW_FORM_data16 = 0x1e
+DW_FORM_string = 0x08
+DW_FORM_strp = 0x0e
+DW_FORM_udata = 0x0f
+DW_FORM_line_strp = 0x1f
+DW_FORM_strx = 0x1a
+DW_FORM_strx1 = 0x25
+DW_FORM_strx2 = 0x26
+DW_FORM_strx3 = 0x27
+DW_FORM_strx4 = 0x28
+
+_FIXED_FORMS = {
+    DW_FORM_data1: 1, DW_FORM_data2: 2, DW_FORM_data4: 4, DW_FORM_data8: 8,
+    DW_FORM_data16: 16, DW_FORM_strx1: 1, DW_FORM_strx2: 2, DW_FORM_strx3: 3,
+    DW_FORM_strx4: 4,
+}
+# .debug_info の属性で長さが決まっている形式 (上に加えて)
+_INFO_FIXED_FORMS = {**_FIXED_FORMS, **{
+    DW_FORM_flag: 1, DW_FORM_ref1: 1, DW_FORM_ref2: 2, DW_FORM_ref4: 4, DW_FORM_ref8: 8,
+    DW_FORM_ref_sup4: 4, DW_FORM_ref_sig8: 8, DW_FORM_ref_sup8: 8, DW_FORM_flag_present: 0,
+    DW_FORM_implicit_const: 0, DW_FORM_addrx1: 1, DW_FORM_addrx2: 2, DW_FORM_addrx3: 3,
+    DW_FORM_addrx4: 4,
+}}
+_INFO_ULEB_FORMS = (DW_FORM_udata, DW_FORM_ref_udata, DW_FORM_strx, DW_FORM_addrx,
+                    DW_FORM_loclistx, DW_FORM_rnglistx)
+
+
+class _Reader:
+    def __init__(self, buf: bytes, pos: int, endian: str):
+        self.buf = buf
+        self.pos = pos
+        self.endian = endian
+
+    def unpack(self, fmt: str):
+        fmt = self.endian + fmt
+        vals = struct.unpack_from(fmt, self.buf, self.pos)
+        self.pos += struct.calcsize(fmt)
+        return vals[0]
+
+    def uint(self, size: int) -> int:
+        val = int.from_bytes(self.buf[self.pos:self.pos + size],
+                             "little" if self.endian == "<" else "big")
+        self.pos += size
+        return val
+
+    def uleb(self) -> int:
+        val = shift = 0
+        while True:
+            byte = self.buf[self.pos]
+            self.pos += 1
+            val |= (byte & 0x7f) << shift
+            shift += 7
+            if byte < 0x80:
+                return val
+
+    def sleb(self) -> int:
+        val = shift = 0
+        while True:
+            byte = self.buf[self.pos]
+            self.pos += 1
+            val |= (byte & 0x7f) << shift
+            shift += 7
+            if byte < 0x80:
+                if byte & 0x40:
+                    val -= 1 << shift
+                return val
+
+    def string(self) -> str:
+        end = self.buf.find(b"\0", self.pos)
+        if end < 0:
+            raise ElfError("Unterminated string in .debug_line")
+        val = self.buf[self.pos:end].decode("utf-8", "replace")
+        self.pos = end + 1
+        return val
+
+
+# DWARF 5 の表 (ディレクトリ・ファイル) を読む 項目ごとに {DW_LNCT_*: 値}
+def __entry_table(r: _Reader, offset_size: int, strs: Dict[str, bytes]) -> List[Dict[int, Any]]:
+    formats = [(r.uleb(), r.uleb()) for _ in range(r.uint(1))]
+    entries = []
+    for _ in range(r.uleb()):
+        entry = {}
+        for content, form in formats:
+            if form == DW_FORM_string:
+                val = r.string()
+            elif form in (DW_FORM_line_strp, DW_FORM_strp):
+                off = r.uint(offset_size)
+                sec = strs[".debug_line_str" if form == DW_FORM_line_strp else ".debug_str"]
+                val = cstring(sec, off) if off < len(sec) else ""
+            elif form == DW_FORM_udata:
+                val = r.uleb()
+            elif form == DW_FORM_strx:  # .debug_str_offsets は読まない
+                r.uleb()
+                val = ""
+            elif form in _FIXED_FORMS:
+                val = r.uint(_FIXED_FORMS[form])
+                if form in (DW_FORM_strx1, DW_FORM_strx2, DW_FORM_strx3, DW_FORM_strx4):
+                    val = ""
+            elif form == DW_FORM_block:
+                r.pos += r.uleb()
+                val = None
+            elif form == DW_FORM_block1:
+                r.pos += r.uint(1)
+                val = None
+            else:
+                raise ElfError(f"Unsupported form {hex(form)} in .debug_line")
+            entry[content] = val
+        entries.append(entry)
+    return entries
+
+
+# .debug_abbrev のoffsetから始まる表で、番号がcodeの項目の (属性, 形式) の並び
+def __abbrev(buf: bytes, offset: int, code: int) -> List[Tuple[int, int]]:
+    r = _Reader(buf, offset, "<")  # ULEB128だけなのでエンディアンは関係ない
+    while True:
+        entry = r.uleb()
+        if entry == 0:
+            raise ElfError(f"Abbreviation {code} not found in .debug_abbrev")
+        r.uleb()  # tag
+        r.uint(1)  # children
+        attrs = []
+        while True:
+            attr, form = r.uleb(), r.uleb()
+            if attr == 0 and form == 0:
+                break
+            if form == DW_FORM_implicit_const:  # 値は表の方に入っている
+                r.sleb()
+            attrs.append((attr, form))
+        if entry == code:
+            return attrs
+
+
+# .debug_info の属性の値を読む (文字列と数値以外は読み飛ばしてNone)
+def __attribute(r: _Reader, form: int, version: int, offset_size: int, address_size: int,
+                strs: Dict[str, bytes]) -> Any:
+    if form == DW_FORM_indirect:
+        form = r.uleb()
+    if form == DW_FORM_string:
+        return r.string()
+    if form in (DW_FORM_strp, DW_FORM_line_strp):
+        off = r.uint(offset_size)
+        sec = strs[".debug_line_str" if form == DW_FORM_line_strp else ".debug_str"]
+        return cstring(sec, off) if off < len(sec) else ""
+    if form in (DW_FORM_sec_offset, DW_FORM_strp_sup):
+        return r.uint(offset_size)
+    if form == DW_FORM_ref_addr:  # DWARF 2 だけアドレスの大きさ
+        return r.uint(address_size if version == 2 else offset_size)
+    if form == DW_FORM_addr:
+        return r.uint(address_size)
+    if form in _INFO_FIXED_FORMS:
+        return r.uint(_INFO_FIXED_FORMS[form])
+    if form in _INFO_ULEB_FORMS:
+        return r.uleb()
+    if form == DW_FORM_sdata:
+        return r.sleb()
+    if form in (DW_FORM_block, DW_FORM_exprloc):
+        r.pos += r.uleb()
+    elif form in (DW_FORM_block1, DW_FORM_block2, DW_FORM_block4):
+        r.pos += r.uint({DW_FORM_block1: 1, DW_FORM_block2: 2, DW_FORM_block4: 4}[form])
+    else:
+        raise ElfError(f"Unsupported form {hex(form)} in .debug_info")
+    return None
+
+
+# コンパイル単位ごとの DW_AT_stmt_list (.debug_lineでの位置) -> DW_AT_comp_dir
+# 最初のDIE (DW_TAG_compile_unit) の属性だけを読む
+def __comp_dirs(elf: ELF, strs: Dict[str, bytes]) -> Dict[int, str]:
+    info = elf.section(".debug_info")
+    abbrev = elf.section(".debug_abbrev")
+    if info is None or abbrev is None:
+        return {}
+    buf = elf.data(info)
+    abbrevs = elf.data(abbrev)
+
+    ret = {}
+    pos = 0
+    while pos < len(buf):
+        r = _Reader(buf, pos, elf.endian)
+        unit_length = r.uint(4)
+        offset_size = 4
+        if unit_length == 0xffffffff:  # 64bit DWARF
+            unit_length = r.uint(8)
+            offset_size = 8
+        pos = r.pos + unit_length
+        try:
+            version = r.uint(2)
+            if not 2 <= version <= 5:
+                continue
+            if version >= 5:
+                unit_type = r.uint(1)
+                if unit_type in (DW_UT_type, DW_UT_split_type):  # 型のユニットにはない
+                    continue
+                address_size = r.uint(1)
+                abbrev_offset = r.uint(offset_size)
+                if unit_type in (DW_UT_skeleton, DW_UT_split_compile):
+                    r.uint(8)  # dwo_id
+            else:
+                abbrev_offset = r.uint(offset_size)
+                address_size = r.uint(1)
+            attrs = {}
+            for attr, form in __abbrev(abbrevs, abbrev_offset, r.uleb()):
+                attrs[attr] = __attribute(r, form, version, offset_size, address_size, strs)
+        except (ElfError, IndexError):  # 読めないユニットは飛ばす
+            continue
+        stmt_list = attrs.get(DW_AT_stmt_list)
+        comp_dir = attrs.get(DW_AT_comp_dir)
+        if isinstance(stmt_list, int) and isinstance(comp_dir, str):
+            ret[stmt_list] = comp_dir
+    return ret
+
+
+# 1つの行番号プログラム (ユニット) を実行して (アドレス, ファイル, 行) を得る
+# 行が0のものは列の終わり (end_sequence)
+# 相対パスのディレクトリはcomp_dir (コンパイルしたディレクトリ) からのものにする
+def __decode_unit(buf: bytes, pos: int, endian: str, strs: Dict[str, bytes],
+                  comp_dir: str="") -> Tuple[int, List[str], List[Tuple[int, int, int]]]:
+    r = _Reader(buf, pos, endian)
+    unit_length = r.uint(4)
+    offset_size = 4
+    if unit_length == 0xffffffff:  # 64bit DWARF
+        unit_length = r.uint(8)
+        offset_size = 8
+    end = r.pos + unit_length
+    if end > len(buf):
+        raise ElfError("Truncated .debug_line")
+
+    version = r.uint(2)
+    if not 2 <= version <= 5:
+        return end, [], []
+    if version >= 5:
+        r.uint(1)  # address_size (DW_LNE_set_addressの長さからわかる)
+        r.uint(1)  # segment_selector_size
+    header_length = r.uint(offset_size)
+    program = r.pos + header_length
+    min_inst_length = r.uint(1)
+    if version >= 4:
+        r.uint(1)  # maximum_operations_per_instruction (VLIWでなければ1)
+    r.uint(1)  # default_is_stmt (is_stmtで行を選ばないので使わない)
+    line_base = r.unpack("b")
+    line_range = r.uint(1)
+    opcode_base = r.uint(1)
+    opcode_lengths = [r.uint(1) for _ in range(opcode_base - 1)]
+
+    files = []
+    if version >= 5:
+        dirs = [e.get(DW_LNCT_path, "") for e in __entry_table(r, offset_size, strs)]
+        if dirs:  # 0はコンパイルしたディレクトリ
+            dirs = [os.path.join(comp_dir, dirs[0])] + \
+                [os.path.join(comp_dir, dirs[0], d) for d in dirs[1:]]
+        for e in __entry_table(r, offset_size, strs):
+            d = e.get(DW_LNCT_directory_index, 0)
+            files.append(os.path.join(dirs[d] if d < len(dirs) else "", e.get(DW_LNCT_path, "")))
+    else:
+        dirs = [comp_dir]  # 0はコンパイルしたディレクトリ
+        while True:
+            name = r.string()
+            if not name:
+                break
+            dirs.append(os.path.join(comp_dir, name))
+        files.append("")  # v2~4 のファイル番号は1から
+        while True:
+            name = r.string()
+            if not name:
+                break
+            d = r.uleb()
+            r.uleb()
+            r.uleb()
+            files.append(os.path.join(dirs[d] if d < len(dirs) else "", name))
+
+    rows = []
+    r.pos = program
+    addr = 0
+    file = 1
+    line = 1
+    while r.pos < end:
+        op = r.uint(1)
+        if op >= opcode_base:  # 特殊オペコード
+            adj = op - opcode_base
+            addr += (adj // line_range) * min_inst_length
+            line += line_base + adj % line_range
+            rows.append((addr, file, line))
+        elif op == 0:  # 拡張オペコード
+            size = r.uleb()
+            sub_end = r.pos + size
+            sub = r.uint(1) if size else 0
+            if sub == DW_LNE_end_sequence:
+                rows.append((addr, file, 0))
+                addr = 0
+                file = 1
+                line = 1
+            elif sub == DW_LNE_set_address:
+                addr = r.uint(size - 1)
+            elif sub == DW_LNE_define_file:
+                name = r.string()
+                d = r.uleb()
+                files.append(os.path.join(dirs[d] if d < len(dirs) else "", name))
+            r.pos = sub_end
+        elif op == DW_LNS_copy:
+            rows.append((addr, file, line))
+        elif op == DW_LNS_advance_pc:
+            addr += r.uleb() * min_inst_length
+        elif op == DW_LNS_advance_line:
+            line += r.sleb()
+        elif op == DW_LNS_set_file:
+            file = r.uleb()
+        elif op == DW_LNS_const_add_pc:
+            addr += ((255 - opcode_base) // line_range) * min_inst_length
+        elif op == DW_LNS_fixed_advance_pc:
+            addr += r.uint(2)
+        else:  # 引数はすべてULEB128
+            for _ in range(opcode_lengths[op - 1]):
+                r.uleb()
+    return end, files, rows
+
+
+# .debug_line を全部読み、アドレス順の (アドレス, ファイル番号, 行) とファイル名の表にする
+def decode_lines(elf: ELF) -> Dict[str, List]:
+    sec = elf.section(".debug_line")
+    if sec is None or elf.hdr["e_type"] == EType.REL.value:  # .oはアドレスが再配置前なので扱わない
+        return {"files": [], "addrs": [], "rows": []}
+    buf = elf.data(sec)
+    strs = {}
+    for name in (".debug_line_str", ".debug_str"):
+        s = elf.section(name)
+        strs[name] = elf.data(s) if s else b""
+    comp_dirs = __comp_dirs(elf, strs)
+
+    files = []
+    index = {}  # ファイル名 -> filesの番号
+    table = {}
+    pos = 0
+    while pos < len(buf):
+        pos, unit_files, rows = __decode_unit(buf, pos, elf.endian, strs, comp_dirs.get(pos, ""))
+        for addr, file, line in rows:
+            if line == 0:
+                table.setdefault(addr, (-1, 0))  # 次の列の先頭は上書きしない
+                continue
+            path = unit_files[file] if file < len(unit_files) else ""
+            if path not in index:
+                index[path] = len(files)
+                files.append(path)
+            table[addr] = (index[path], line)  # 同じアドレスは最後の行を使う
+
+    addrs = sorted(table)
+    return {"files": files, "addrs": addrs, "rows": [list(table[addr]) for addr in addrs]}
+
+
+class LineTable:
+    # base: DW_AT_comp_dirがなく相対パスのままのファイルを探すディレクトリ
+    def __init__(self, table: Dict[str, List], base: str=""):
+        self.files = table["files"]
+        self.addrs = table["addrs"]
+        self.rows = table["rows"]
+        self.base = base
+        self.sources = {}  # ファイル名 -> 行の並び (読めなければNone)
+
+    def digest(self) -> str:
+        return hashlib.sha1(repr((self.files, self.addrs, self.rows)).encode()).hexdigest()
+
+    # addrの命令のソース (ファイル名, 行)
+    def lookup(self, addr: int) -> Optional[Tuple[str, int]]:
+        i = bisect.bisect_right(self.addrs, addr) - 1
+        if i < 0 or self.rows[i][1] == 0:
+            return None
+        return self.files[self.rows[i][0]], self.rows[i][1]
+
+    # ソースファイルがあればその行を返す
+    def source(self, path: str, line: int) -> Optional[str]:
+        if path not in self.sources:
+            try:
+                with open(os.path.join(self.base, path), "r", errors="replace") as f:
+                    self.sources[path] = f.read().split("\n")
+            except OSError:
+                self.sources[path] = None
+        lines = self.sources[path]
+        if lines is None or not 0 < line <= len(lines):
+            return None
+        return lines[line-1]
+
+
+# 行番号表 (ファイルの中身が同じならキャッシュを使う) デバッグ情報がなければNone
+def load_lines(filepath: str) -> Optional[LineTable]:
+    try:
+        key = file_digest(filepath)
+        table = load_cache(CACHE_KIND, key)
+        if table is None:
+            with ELF(filepath) as elf:
+                table = decode_lines(elf)
+            store_cache(CACHE_KIND, key, table)
+    except (OSError, ElfError, IndexError, struct.error):
+        return None
+    if not table["addrs"]:
+        return None
+    return LineTable(table, os.path.dirname(os.path.abspath(filepath)))
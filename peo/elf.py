@@ -0,0 +1,286 @@
+import mmap
+import bisect
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+
+from peo.fhdr import ElfError, parse_fhdr
+
+
+_PHDR_FMT = {
+    "ELF32": ("IIIIIIII", [
+        "p_type", "p_offset", "p_vaddr", "p_paddr",
+        "p_filesz", "p_memsz", "p_flags", "p_align"
+    ]),
+    "ELF64": ("IIQQQQQQ", [
+        "p_type", "p_flags", "p_offset", "p_vaddr",
+        "p_paddr", "p_filesz", "p_memsz", "p_align"
+    ]),
+}
+
+_SHDR_FMT = {
+    "ELF32": "IIIIIIIIII",
+    "ELF64": "IIQQQQIIQQ",
+}
+_SHDR_FIELDS = [
+    "sh_name", "sh_type", "sh_flags", "sh_addr", "sh_offset", "sh_size",
+    "sh_link", "sh_info", "sh_addralign", "sh_entsize"
+]
+
+_SYM_FMT = {
+    "ELF32": ("IIIBBH", [
+        "st_name", "st_value", "st_size", "st_info", "st_other", "st_shndx"
+    ]),
+    "ELF64": ("IBBHQQ", [
+        "st_name", "st_info", "st_other", "st_shndx", "st_value", "st_size"
+    ]),
+}
+
+_DYN_FMT = {
+    "ELF32": "iI",
+    "ELF64": "qQ",
+}
+
+PT_LOAD = 0x01
+PT_DYNAMIC = 0x02
+DT_NULL = 0x00
+DT_STRTAB = 0x05
+
+SHN_UNDEF = 0x00
+SHN_XINDEX = 0xffff
+SHT_NOBITS = 0x08
+STT_FUNC = 0x02
+
+
+# ファイルをmmapして、ヘッダ類は必要になったときに一度だけデコードする
+# bufを渡したときはファイルを開かずにその中身を読む (アーカイブのメンバーなど)
+class ELF:
+    def __init__(self, filepath: str, buf: Optional[bytes]=None):
+        self.filepath = filepath
+        self.owns_buf = buf is None
+        if buf is not None:
+            self.buf = buf
+        else:
+            with open(filepath, "rb") as f:
+                try:
+                    self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except ValueError:  # 空のファイル
+                    raise ElfError("Not an ELF file")
+        try:
+            self.hdr = parse_fhdr(self.buf[:64])
+        except ElfError:
+            self.close()
+            raise
+        self.ei_class = self.hdr["ei_class"]
+        self.endian = self.hdr["endian"]
+        self._segments = None
+        self._sections = None
+        self._symbols = None
+        self._functions = None
+        self._dynamic = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.buf is not None and self.owns_buf:
+            self.buf.close()
+        self.buf = None
+
+    def __table(self, offset: int, num: int, entsize: int, fmt: str, what: str):
+        fmt = self.endian + fmt
+        size = struct.calcsize(fmt)
+        if num == 0 or offset == 0:
+            return []
+        if entsize < size or offset + num * entsize > len(self.buf):
+            raise ElfError(f"Truncated {what} table")
+        return [struct.unpack_from(fmt, self.buf, offset + i * entsize)
+                for i in range(num)]
+
+    @property
+    def segments(self) -> List[Dict[str, Any]]:
+        if self._segments is None:
+            fmt, fields = _PHDR_FMT[self.ei_class]
+            rows = self.__table(
+                self.hdr["e_phoff"], self.hdr["e_phnum"],
+                self.hdr["e_phentsize"], fmt, "program header"
+            )
+            self._segments = [dict(zip(fields, row)) for row in rows]
+        return self._segments
+
+    @property
+    def sections(self) -> List[Dict[str, Any]]:
+        if self._sections is None:
+            self._sections = self.__read_sections()
+        return self._sections
+
+    def __read_sections(self) -> List[Dict[str, Any]]:
+        fmt = _SHDR_FMT[self.ei_class]
+        shoff = self.hdr["e_shoff"]
+        shnum = self.hdr["e_shnum"]
+        shstrndx = self.hdr["e_shstrndx"]
+        entsize = self.hdr["e_shentsize"]
+
+        # セクション数が多いときは0番目のセクションに本当の値が入っている
+        if shoff and (shnum == 0 or shstrndx == SHN_XINDEX):
+            first = dict(zip(_SHDR_FIELDS, self.__table(
+                shoff, 1, entsize, fmt, "section header")[0]))
+            if shnum == 0:
+                shnum = first["sh_size"]
+            if shstrndx == SHN_XINDEX:
+                shstrndx = first["sh_link"]
+
+        rows = self.__table(shoff, shnum, entsize, fmt, "section header")
+        sections = [dict(zip(_SHDR_FIELDS, row)) for row in rows]
+
+        strtab = b""
+        if 0 < shstrndx < len(sections):
+            strtab = self.data(sections[shstrndx])
+        for sec in sections:
+            sec["name"] = cstring(strtab, sec["sh_name"])
+        return sections
+
+    def section(self, name: str) -> Optional[Dict[str, Any]]:
+        for sec in self.sections:
+            if sec["name"] == name:
+                return sec
+        return None
+
+    def data(self, sec: Dict[str, Any]) -> bytes:
+        if sec["sh_type"] == SHT_NOBITS:
+            return b""
+        start = sec["sh_offset"]
+        end = start + sec["sh_size"]
+        if end > len(self.buf):
+            raise ElfError(f"Section {sec.get('name', '')} is out of the file")
+        return self.buf[start:end]
+
+    def segment(self, p_type: int) -> Optional[Dict[str, Any]]:
+        for seg in self.segments:
+            if seg["p_type"] == p_type:
+                return seg
+        return None
+
+    # 仮想アドレスをファイル上のオフセットにする
+    def vaddr_to_offset(self, addr: int) -> Optional[int]:
+        for seg in self.segments:
+            if seg["p_type"] == PT_LOAD and \
+                    seg["p_vaddr"] <= addr < seg["p_vaddr"] + seg["p_filesz"]:
+                return addr - seg["p_vaddr"] + seg["p_offset"]
+        return None
+
+    # 動的セクションの (d_tag, d_val) の並び
+    @property
+    def dynamic(self) -> List[Tuple[int, int]]:
+        if self._dynamic is None:
+            self._dynamic = []
+            seg = self.segment(PT_DYNAMIC)
+            if seg is not None:
+                start, size = seg["p_offset"], seg["p_filesz"]
+            else:
+                sec = self.section(".dynamic")
+                if sec is None:
+                    return self._dynamic
+                start, size = sec["sh_offset"], sec["sh_size"]
+            fmt = self.endian + _DYN_FMT[self.ei_class]
+            entsize = struct.calcsize(fmt)
+            end = min(start + size, len(self.buf))
+            for off in range(start, end - entsize + 1, entsize):
+                tag, val = struct.unpack_from(fmt, self.buf, off)
+                if tag == DT_NULL:
+                    break
+                self._dynamic.append((tag, val))
+        return self._dynamic
+
+    # DT_STRTAB の中の文字列 (DT_NEEDED, DT_RPATH などの値)
+    def dynamic_string(self, offset: int) -> str:
+        sec = self.section(".dynstr")
+        if sec is not None:
+            return cstring(self.data(sec), offset)
+        for tag, val in self.dynamic:
+            if tag == DT_STRTAB:
+                start = self.vaddr_to_offset(val)
+                if start is not None:
+                    return cstring(self.buf, start + offset)
+        return ""
+
+    def read_symbols(self, sec: Dict[str, Any]) -> List[Dict[str, Any]]:
+        fmt, fields = _SYM_FMT[self.ei_class]
+        fmt = self.endian + fmt
+        entsize = struct.calcsize(fmt)
+        data = self.data(sec)
+        data = data[:len(data) - len(data) % entsize]
+
+        strtab = b""
+        if 0 < sec["sh_link"] < len(self.sections):
+            strtab = self.data(self.sections[sec["sh_link"]])
+
+        symbols = []
+        for row in struct.iter_unpack(fmt, data):
+            sym = dict(zip(fields, row))
+            sym["name"] = cstring(strtab, sym["st_name"])
+            sym["type"] = sym["st_info"] & 0xf
+            sym["bind"] = sym["st_info"] >> 4
+            symbols.append(sym)
+        return symbols
+
+    # .symtab (stripされていれば .dynsym) のシンボル
+    @property
+    def symbols(self) -> List[Dict[str, Any]]:
+        if self._symbols is None:
+            sec = self.section(".symtab") or self.section(".dynsym")
+            self._symbols = self.read_symbols(sec) if sec else []
+        return self._symbols
+
+    # アドレス順に並べた関数シンボル
+    @property
+    def functions(self) -> List[Dict[str, Any]]:
+        if self._functions is None:
+            fcns = [
+                sym for sym in self.symbols
+                if sym["type"] == STT_FUNC and sym["st_shndx"] != SHN_UNDEF
+            ]
+            self._functions = sorted(fcns, key=lambda sym: sym["st_value"])
+        return self._functions
+
+    # addrを含む関数 (大きさ0のシンボルは次の関数かセクションの終わりまでとみなす)
+    def function_at(self, addr: int) -> Optional[Dict[str, Any]]:
+        fcns = self.functions
+        starts = [sym["st_value"] for sym in fcns]
+        i = bisect.bisect_right(starts, addr) - 1
+        if i < 0:
+            return None
+        sym = fcns[i]
+        if addr < self.function_end(sym):
+            return sym
+        return None
+
+    def function_end(self, sym: Dict[str, Any]) -> int:
+        if sym["st_size"]:
+            return sym["st_value"] + sym["st_size"]
+        end = None
+        if sym["st_shndx"] < len(self.sections):
+            sec = self.sections[sym["st_shndx"]]
+            end = sec["sh_addr"] + sec["sh_size"]
+        i = self.functions.index(sym)
+        for nxt in self.functions[i+1:]:
+            if nxt["st_value"] > sym["st_value"]:
+                if end is None or nxt["st_value"] < end:
+                    end = nxt["st_value"]
+                break
+        return end if end is not None else sym["st_value"]
+
+    def symbol_addr(self, name: str) -> Optional[int]:
+        for sym in self.functions:
+            if sym["name"] == name:
+                return sym["st_value"]
+        return None
+
+
+def cstring(buf: bytes, offset: int) -> str:
+    end = buf.find(b"\0", offset)
+    if end < 0:
+        end = len(buf)
+    return buf[offset:end].decode("utf-8", "backslashreplace")
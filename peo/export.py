@@ -0,0 +1,209 @@
+import os
+import re
+import sys
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Set
+
+from peo.fhdr import ElfError, read_fhdr, walk_files
+from peo.util import format_message, objdump, split_functions, split_inst
+from peo.util import ObjdumpError, fcn_bounds, file_digest
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS binaries (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    sha256 TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS functions (
+    id INTEGER PRIMARY KEY,
+    binary_id INTEGER NOT NULL REFERENCES binaries(id),
+    name TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    ninsts INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS instructions (
+    binary_id INTEGER NOT NULL REFERENCES binaries(id),
+    function_id INTEGER NOT NULL REFERENCES functions(id),
+    address INTEGER NOT NULL,
+    bytes TEXT NOT NULL,
+    mnemonic TEXT NOT NULL,
+    operands TEXT NOT NULL,
+    comment TEXT
+);
+CREATE TABLE IF NOT EXISTS rodata_refs (
+    binary_id INTEGER NOT NULL REFERENCES binaries(id),
+    function_id INTEGER NOT NULL REFERENCES functions(id),
+    address INTEGER NOT NULL,
+    target INTEGER NOT NULL,
+    string TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS checksec (
+    binary_id INTEGER PRIMARY KEY REFERENCES binaries(id),
+    relro TEXT NOT NULL,
+    canary TEXT NOT NULL,
+    nx TEXT NOT NULL,
+    pie TEXT NOT NULL,
+    fortified INTEGER NOT NULL,
+    fortifiable INTEGER NOT NULL,
+    rpath TEXT,
+    runpath TEXT,
+    stripped INTEGER NOT NULL,
+    debug_info INTEGER NOT NULL,
+    symbols INTEGER NOT NULL,
+    dynsyms INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS functions_binary_name ON functions(binary_id, name);
+CREATE INDEX IF NOT EXISTS functions_ninsts ON functions(ninsts);
+CREATE INDEX IF NOT EXISTS instructions_binary_address ON instructions(binary_id, address);
+CREATE INDEX IF NOT EXISTS instructions_function ON instructions(function_id);
+CREATE INDEX IF NOT EXISTS instructions_mnemonic ON instructions(mnemonic);
+CREATE INDEX IF NOT EXISTS rodata_refs_target ON rodata_refs(target);
+"""
+
+_target = re.compile(r"([0-9a-f]+)")
+
+# ワーカーごとに持つ、DBに入っているバイナリのハッシュ
+_known = set()
+
+
+def __init_worker(known: Set[str]):
+    global _known
+    _known = known
+
+
+# .rodataの中のアドレスならそこにある文字列を返す
+def __rodata_string(rodata: Optional[Dict[str, Any]], data: bytes, addr: int) -> Optional[str]:
+    if rodata is None:
+        return None
+    off = addr - rodata["sh_addr"]
+    if not 0 <= off < len(data):
+        return None
+    end = data.find(b"\0", off)
+    return data[off:end if end >= 0 else len(data)].decode("utf-8", "backslashreplace")
+
+
+# 1つのバイナリを解析して、DBに入れる行を作る (ワーカープロセスで動く)
+def collect(filepath: str) -> Dict[str, Any]:
+    from peo.elf import ELF
+    from peo.checksec import checksec_props, labels
+
+    try:
+        read_fhdr(filepath)
+        digest = file_digest(filepath)
+    except (OSError, ElfError) as e:
+        return {"path": filepath, "error": e.strerror if isinstance(e, OSError) and e.strerror else str(e)}
+    if digest in _known:
+        return {"path": filepath, "sha256": digest, "skipped": True}
+
+    try:
+        msgs = format_message(objdump(filepath))
+    except ObjdumpError as e:
+        return {"path": filepath, "error": str(e)}
+
+    with ELF(filepath) as elf:
+        rodata = elf.section(".rodata")
+        data = elf.data(rodata) if rodata else b""
+
+        functions = []
+        for name, fcn_msgs in split_functions(msgs):
+            start, end = fcn_bounds(fcn_msgs)
+            insts = []
+            refs = []
+            for msg in fcn_msgs[1:]:
+                addr = int(msg[0][:-1], 16)
+                if len(msg) < 3:  # バイト列の続き
+                    if insts:
+                        insts[-1][1] += " " + msg[1]
+                    continue
+                mnem, ops = split_inst(msg[2])
+                comment = msg[3] if len(msg) >= 4 else None
+                insts.append([addr, msg[1], mnem, ops, comment])
+
+                if mnem == "lea" and comment:
+                    match = _target.match(comment)
+                    string = __rodata_string(rodata, data, int(match.group(1), 16))
+                    if string is not None:
+                        refs.append((addr, int(match.group(1), 16), string))
+            functions.append((name, start, end, insts, refs))
+
+    props = checksec_props(filepath)
+    return {
+        "path": filepath,
+        "sha256": digest,
+        "size": os.path.getsize(filepath),
+        "functions": functions,
+        "checksec": [labels[key][props[key]] for key in ("relro", "canary", "nx", "pie")] + [
+            len(props["fortified"]), len(props["fortifiable"]),
+            ":".join(props["rpath"]) or None, ":".join(props["runpath"]) or None,
+            int(props["stripped"]), int(props["debug"]),
+            props["symbols"], props["dynsyms"]
+        ],
+    }
+
+
+# 書き込みはこのプロセスだけが行う 1バイナリを1トランザクションで入れる
+def __write(con: sqlite3.Connection, result: Dict[str, Any]) -> bool:
+    with con:
+        cur = con.cursor()
+        if cur.execute("SELECT 1 FROM binaries WHERE sha256 = ?", (result["sha256"],)).fetchone():
+            return False
+        cur.execute(
+            "INSERT INTO binaries (path, sha256, size) VALUES (?, ?, ?)",
+            (result["path"], result["sha256"], result["size"])
+        )
+        binary_id = cur.lastrowid
+        fid = cur.execute("SELECT COALESCE(MAX(id), 0) FROM functions").fetchone()[0]
+
+        fcn_rows = []
+        inst_rows = []
+        ref_rows = []
+        for name, start, end, insts, refs in result["functions"]:
+            fid += 1
+            fcn_rows.append((fid, binary_id, name, start, end, len(insts)))
+            inst_rows += [(binary_id, fid, *inst) for inst in insts]
+            ref_rows += [(binary_id, fid, *ref) for ref in refs]
+
+        cur.executemany(
+            "INSERT INTO functions (id, binary_id, name, start, end, ninsts) "
+            "VALUES (?, ?, ?, ?, ?, ?)", fcn_rows)
+        cur.executemany(
+            "INSERT INTO instructions (binary_id, function_id, address, bytes, "
+            "mnemonic, operands, comment) VALUES (?, ?, ?, ?, ?, ?, ?)", inst_rows)
+        cur.executemany(
+            "INSERT INTO rodata_refs (binary_id, function_id, address, target, string) "
+            "VALUES (?, ?, ?, ?, ?)", ref_rows)
+        cur.execute(
+            "INSERT INTO checksec (binary_id, relro, canary, nx, pie, fortified, "
+            "fortifiable, rpath, runpath, stripped, debug_info, symbols, dynsyms) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (binary_id, *result["checksec"]))
+    return True
+
+
+def export_sqlite(dbpath: str, paths: List[str], recursive: bool = False,
+                  jobs: Optional[int] = None):
+    con = sqlite3.connect(dbpath)
+    con.executescript(SCHEMA)
+    known = {row[0] for row in con.execute("SELECT sha256 FROM binaries")}
+
+    added = skipped = failed = 0
+    files = list(walk_files(paths, recursive))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=__init_worker,
+                             initargs=(known,)) as executor:
+        futures = [executor.submit(collect, filepath) for filepath in files]
+        for future in as_completed(futures):
+            result = future.result()
+            if "error" in result:
+                print(f"{result['path']}: {result['error']}", file=sys.stderr)
+                failed += 1
+            elif result.get("skipped") or not __write(con, result):
+                skipped += 1
+            else:
+                added += 1
+    con.close()
+
+    print(f"{added} added, {skipped} skipped (already in {dbpath}), {failed} failed")
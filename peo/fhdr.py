@@ -1,6 +1,10 @@
+import os
+import sys
+import struct
 from enum import Enum
+from typing import Any, Dict, Iterator, List, Optional
 
-from peo.util import Color
+from peo.util.color import Color
 
 
 class EiClass(Enum):
@@ -54,61 +58,275 @@ class EMachine(Enum):
     AARCH64 = 0xb7
 
 
-def fhdr32(buf):
-    # 例外処理なくていい......?
-    print(f"ELF Header:")
-    print(f"  Magic:   {Color.redify(buf[:4].hex()) + buf[4:16].hex()}")
-    print(f"  Class:                             {EiClass(buf[4]).name}")
-    print(f"  Data:                              {EiData(buf[5]).name}")
-    print(f"  Version:                           {EiVersion(buf[6]).name}")
-    print(f"  OS/ABI:                            {EiOsAbi(buf[7]).name}")
-    print(f"  Type:                              {EType(int.from_bytes(buf[16:18], 'little')).name}")
-    print(f"  Machine:                           {EMachine(int.from_bytes(buf[18:20], 'little')).name}")
-    print(f"  Entry point address:               0x{buf[24:28][::-1].hex()}")
-    print(f"  Start of program headers:          0x{buf[28:32][::-1].hex()} (bytes into file)")
-    print(f"  Start of section headers:          0x{buf[32:36][::-1].hex()} (bytes into file)")
-    print(f"  Flags:                             0x{buf[36:40][::-1].hex()}")
-    print(f"  Size of this header:               0x{buf[40:42][::-1].hex()} (bytes)")
-    print(f"  Size of program headers:           0x{buf[42:44][::-1].hex()} (bytes)")
-    print(f"  Number of program headers:         0x{buf[44:46][::-1].hex()}")
-    print(f"  Size of section headers:           0x{buf[46:48][::-1].hex()} (bytes)")
-    print(f"  Number of section headers:         0x{buf[48:50][::-1].hex()}")
-    print(f"  Section header string table index: 0x{buf[50:52][::-1].hex()}")
-
-
-def fhdr64(buf):
-    # 例外処理なくていい......?
-    print(f"ELF Header:")
-    print(f"  Magic:   {Color.redify(buf[:4].hex()) + buf[4:16].hex()}")
-    print(f"  Class:                             {EiClass(buf[4]).name}")
-    print(f"  Data:                              {EiData(buf[5]).name}")
-    print(f"  Version:                           {EiVersion(buf[6]).name}")
-    print(f"  OS/ABI:                            {EiOsAbi(buf[7]).name}")
-    print(f"  Type:                              {EType(int.from_bytes(buf[16:18], 'little')).name}")
-    print(f"  Machine:                           {EMachine(int.from_bytes(buf[18:20], 'little')).name}")
-    print(f"  Entry point address:               0x{buf[24:32][::-1].hex()}")
-    print(f"  Start of program headers:          0x{buf[32:40][::-1].hex()} (bytes into file)")
-    print(f"  Start of section headers:          0x{buf[40:48][::-1].hex()} (bytes into file)")
-    print(f"  Flags:                             0x{buf[48:52][::-1].hex()}")
-    print(f"  Size of this header:               0x{buf[52:54][::-1].hex()} (bytes)")
-    print(f"  Size of program headers:           0x{buf[54:56][::-1].hex()} (bytes)")
-    print(f"  Number of program headers:         0x{buf[56:58][::-1].hex()}")
-    print(f"  Size of section headers:           0x{buf[58:60][::-1].hex()} (bytes)")
-    print(f"  Number of section headers:         0x{buf[60:62][::-1].hex()}")
-    print(f"  Section header string table index: 0x{buf[62:64][::-1].hex()}")
+class PType(Enum):
+    NULL = 0x00
+    LOAD = 0x01
+    DYNAMIC = 0x02
+    INTERP = 0x03
+    NOTE = 0x04
+    SHLIB = 0x05
+    PHDR = 0x06
+    TLS = 0x07
+    GNU_EH_FRAME = 0x6474e550
+    GNU_STACK = 0x6474e551
+    GNU_RELRO = 0x6474e552
+    GNU_PROPERTY = 0x6474e553
 
 
-def fhdr(filepath):
+class ShType(Enum):
+    NULL = 0x00
+    PROGBITS = 0x01
+    SYMTAB = 0x02
+    STRTAB = 0x03
+    RELA = 0x04
+    HASH = 0x05
+    DYNAMIC = 0x06
+    NOTE = 0x07
+    NOBITS = 0x08
+    REL = 0x09
+    SHLIB = 0x0a
+    DYNSYM = 0x0b
+    INIT_ARRAY = 0x0e
+    FINI_ARRAY = 0x0f
+    PREINIT_ARRAY = 0x10
+    GROUP = 0x11
+    SYMTAB_SHNDX = 0x12
+    GNU_HASH = 0x6ffffff6
+    GNU_VERDEF = 0x6ffffffd
+    GNU_VERNEED = 0x6ffffffe
+    GNU_VERSYM = 0x6fffffff
+    X86_64_UNWIND = 0x70000001
+
+
+class ElfError(Exception):
+    pass
+
+
+# e_ident以降のフィールド (e_type ~ e_shstrndx)
+_EHDR_FMT = {
+    "ELF32": "HHIIIIIHHHHHH",
+    "ELF64": "HHIQQQIHHHHHH",
+}
+_EHDR_FIELDS = [
+    "e_type", "e_machine", "e_version", "e_entry", "e_phoff", "e_shoff",
+    "e_flags", "e_ehsize", "e_phentsize", "e_phnum", "e_shentsize",
+    "e_shnum", "e_shstrndx"
+]
+
+
+# 定義にない値はそのまま16進で返す
+def enum_name(enum, value: int) -> str:
+    try:
+        return enum(value).name
+    except ValueError:
+        return hex(value)
+
+
+def parse_fhdr(buf: bytes) -> Dict[str, Any]:
+    if len(buf) < 16 or buf[:4] != b"\x7fELF":
+        raise ElfError("Not an ELF file")
+    if buf[4] not in (EiClass.ELF32.value, EiClass.ELF64.value):
+        raise ElfError("Only elf32 and elf64 are supported")
+    if buf[5] not in (EiData.LSB.value, EiData.MSB.value):
+        raise ElfError("Unknown data encoding")
+
+    ei_class = EiClass(buf[4]).name
+    endian = "<" if buf[5] == EiData.LSB.value else ">"
+    fmt = endian + _EHDR_FMT[ei_class]
+    if len(buf) < 16 + struct.calcsize(fmt):
+        raise ElfError("Truncated ELF header")
+
+    hdr = dict(zip(_EHDR_FIELDS, struct.unpack_from(fmt, buf, 16)))
+    hdr["ei_class"] = ei_class
+    hdr["ei_data"] = EiData(buf[5]).name
+    hdr["ei_version"] = enum_name(EiVersion, buf[6])
+    hdr["ei_osabi"] = enum_name(EiOsAbi, buf[7])
+    hdr["endian"] = endian
+    return hdr
+
+
+def read_fhdr(filepath: str) -> Dict[str, Any]:
     with open(filepath, "rb") as f:
         buf = f.read(64)
+    return parse_fhdr(buf)
+
 
+def fhdr(filepath):
     try:
-        ei_class = EiClass(buf[4]).name
-    except ValueError:
-        pass
-    if ei_class == "ELF32":
-        fhdr32(buf)
-    elif ei_class == "ELF64":
-        fhdr64(buf)
-    else:
-        print("Only elf32 and elf64 are supported")
+        with open(filepath, "rb") as f:
+            buf = f.read(64)
+    except OSError as e:
+        print(f"{filepath}: {e.strerror or e}", file=sys.stderr)
+        return
+
+    try:
+        hdr = parse_fhdr(buf)
+    except ElfError as e:
+        print(e)
+        return
+
+    # 値はEI_DATAのバイト順で読んだもの 定義にない値は16進で表示する
+    width = 8 if hdr["ei_class"] == "ELF32" else 16
+    print(f"ELF Header:")
+    print(f"  Magic:   {Color.redify(buf[:4].hex()) + buf[4:16].hex()}")
+    print(f"  Class:                             {hdr['ei_class']}")
+    print(f"  Data:                              {hdr['ei_data']}")
+    print(f"  Version:                           {hdr['ei_version']}")
+    print(f"  OS/ABI:                            {hdr['ei_osabi']}")
+    print(f"  Type:                              {enum_name(EType, hdr['e_type'])}")
+    print(f"  Machine:                           {enum_name(EMachine, hdr['e_machine'])}")
+    print(f"  Entry point address:               0x{hdr['e_entry']:0{width}x}")
+    print(f"  Start of program headers:          0x{hdr['e_phoff']:0{width}x} (bytes into file)")
+    print(f"  Start of section headers:          0x{hdr['e_shoff']:0{width}x} (bytes into file)")
+    print(f"  Flags:                             0x{hdr['e_flags']:08x}")
+    print(f"  Size of this header:               0x{hdr['e_ehsize']:04x} (bytes)")
+    print(f"  Size of program headers:           0x{hdr['e_phentsize']:04x} (bytes)")
+    print(f"  Number of program headers:         0x{hdr['e_phnum']:04x}")
+    print(f"  Size of section headers:           0x{hdr['e_shentsize']:04x} (bytes)")
+    print(f"  Number of section headers:         0x{hdr['e_shnum']:04x}")
+    print(f"  Section header string table index: 0x{hdr['e_shstrndx']:04x}")
+
+
+def __pflags(flags: int) -> str:
+    return "".join(c if flags & bit else " " for c, bit in zip("RWE", (4, 2, 1)))
+
+
+def __shflags(flags: int) -> str:
+    letters = zip(
+        "WAXMSILOGTC",
+        (0x1, 0x2, 0x4, 0x10, 0x20, 0x40, 0x80, 0x100, 0x200, 0x400, 0x800)
+    )
+    return "".join(c for c, bit in letters if flags & bit)
+
+
+def phdr(filepath: str):
+    from peo.elf import ELF
+
+    try:
+        with ELF(filepath) as elf:
+            segments = elf.segments
+            width = 16 if elf.ei_class == "ELF64" else 8
+    except ElfError as e:
+        print(e)
+        return
+
+    if not segments:
+        print("There are no program headers in this file.")
+        return
+
+    lines = ["Program Headers:"]
+    lines.append(
+        f"  {'Type':<14} {'Offset':<{width+2}} {'VirtAddr':<{width+2}} "
+        f"{'PhysAddr':<{width+2}} {'FileSiz':<{width+2}} {'MemSiz':<{width+2}} "
+        f"Flg Align"
+    )
+    for seg in segments:
+        lines.append(
+            f"  {enum_name(PType, seg['p_type']):<14} "
+            f"0x{seg['p_offset']:0{width}x} 0x{seg['p_vaddr']:0{width}x} "
+            f"0x{seg['p_paddr']:0{width}x} 0x{seg['p_filesz']:0{width}x} "
+            f"0x{seg['p_memsz']:0{width}x} {__pflags(seg['p_flags'])} "
+            f"0x{seg['p_align']:x}"
+        )
+    print("\n".join(lines))
+
+
+def shdr(filepath: str):
+    from peo.elf import ELF
+
+    try:
+        with ELF(filepath) as elf:
+            sections = elf.sections
+            width = 16 if elf.ei_class == "ELF64" else 8
+    except ElfError as e:
+        print(e)
+        return
+
+    lines = ["Section Headers:"]
+    lines.append(
+        f"  [Nr] {'Name':<18} {'Type':<14} {'Address':<{width}} "
+        f"{'Off':<8} {'Size':<8} {'ES':<4} {'Flg':<4} Lk Inf Al"
+    )
+    for i, sec in enumerate(sections):
+        lines.append(
+            f"  [{i:>2}] {sec['name'][:18]:<18} "
+            f"{enum_name(ShType, sec['sh_type']):<14} "
+            f"{sec['sh_addr']:0{width}x} {sec['sh_offset']:08x} "
+            f"{sec['sh_size']:08x} {sec['sh_entsize']:04x} "
+            f"{__shflags(sec['sh_flags']):<4} {sec['sh_link']:>2} "
+            f"{sec['sh_info']:>3} {sec['sh_addralign']:>2}"
+        )
+    lines.append(
+        "Key to Flags:\n"
+        "  W (write), A (alloc), X (execute), M (merge), S (strings), I (info),\n"
+        "  L (link order), O (extra OS processing required), G (group), T (TLS),\n"
+        "  C (compressed)"
+    )
+    print("\n".join(lines))
+
+
+# ディレクトリは(recursiveなら)中のファイルに展開する
+def walk_files(paths: List[str], recursive: bool = False) -> Iterator[str]:
+    for path in paths:
+        if os.path.isdir(path):
+            if not recursive:
+                print(f"{path}: Is a directory (use --recursive)", file=sys.stderr)
+                continue
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    filepath = os.path.join(root, name)
+                    if os.path.isfile(filepath) and not os.path.islink(filepath):
+                        yield filepath
+        else:
+            yield path
+
+
+def __fhdr_entry(filepath: str) -> Dict[str, Any]:
+    try:
+        hdr = read_fhdr(filepath)
+    except (OSError, ElfError) as e:
+        msg = e.strerror if isinstance(e, OSError) and e.strerror else str(e)
+        return {"path": filepath, "error": msg}
+    return {
+        "path": filepath,
+        "class": hdr["ei_class"],
+        "data": hdr["ei_data"],
+        "osabi": hdr["ei_osabi"],
+        "type": enum_name(EType, hdr["e_type"]),
+        "machine": enum_name(EMachine, hdr["e_machine"]),
+        "entry": hdr["e_entry"],
+        "phnum": hdr["e_phnum"],
+        "shnum": hdr["e_shnum"],
+    }
+
+
+def fhdr_batch(paths: List[str], recursive: bool = False,
+               fmt: str = "table", jobs: Optional[int] = None):
+    # 1ファイルの -f では使わないので、ここで読み込む
+    import json
+    from concurrent.futures import ThreadPoolExecutor
+
+    files = walk_files(paths, recursive)
+    # 先頭64byteを読むだけのI/O待ちが中心なのでスレッドで並べる
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        entries = executor.map(__fhdr_entry, files)
+
+        if fmt == "jsonl":
+            for entry in entries:
+                sys.stdout.write(json.dumps(entry) + "\n")
+            return
+
+        sys.stdout.write(
+            f"{'CLASS':<6} {'DATA':<4} {'TYPE':<5} {'MACHINE':<8} "
+            f"{'ENTRY':<18} {'PH':>3} {'SH':>3}  PATH\n"
+        )
+        for entry in entries:
+            if "error" in entry:
+                print(f"{entry['path']}: {entry['error']}", file=sys.stderr)
+                continue
+            sys.stdout.write(
+                f"{entry['class']:<6} {entry['data']:<4} {entry['type']:<5} "
+                f"{entry['machine']:<8} 0x{entry['entry']:<16x} "
+                f"{entry['phnum']:>3} {entry['shnum']:>3}  {entry['path']}\n"
+            )
@@ -0,0 +1,183 @@
+import bisect
+import struct
+import hashlib
+from typing import List, Optional, Tuple
+
+from peo.elf import ELF, SHN_UNDEF
+from peo.fhdr import EType
+
+
+SHT_RELA = 0x04
+SHT_REL = 0x09
+SHF_ALLOC = 0x02
+STT_SECTION = 0x03
+STT_FILE = 0x04
+
+EM_386 = 3
+EM_X86_64 = 62
+# PC相対の再配置 (参照先 = S + A - P + 命令末尾までの長さ)
+# PC32・PLT32の番号はi386とx86_64で同じ
+R_PC32 = 2
+R_PLT32 = 4
+R_X86_64_GOTPCREL = 9
+R_X86_64_GOTPCRELX = 41
+R_X86_64_REX_GOTPCRELX = 42
+_GOT_RELATIVE = (R_X86_64_GOTPCREL, R_X86_64_GOTPCRELX, R_X86_64_REX_GOTPCRELX)
+
+_REL_FMT = {
+    ("ELF32", SHT_REL): ("II", 8),
+    ("ELF32", SHT_RELA): ("IIi", 8),
+    ("ELF64", SHT_REL): ("QQ", 32),
+    ("ELF64", SHT_RELA): ("QQq", 32),
+}
+
+
+# シンボル表と再配置から作った、アドレス順に並べた配列で
+# アドレス -> シンボル+オフセット を二分探索で引く
+class Resolver:
+    def __init__(self, elf: ELF):
+        self.is_rel = elf.hdr["e_type"] == EType.REL.value
+        self.is_exec = elf.hdr["e_type"] == EType.EXEC.value  # 即値がそのままアドレスになる
+        text = elf.section(".text")
+        text_ndx = elf.sections.index(text) if text else None
+
+        # .symtab を優先し、同じアドレスのシンボルは先に見つけたものを使う
+        syms = {}
+        tables = {}
+        for name in (".symtab", ".dynsym"):
+            sec = elf.section(name)
+            if sec is None:
+                continue
+            tables[elf.sections.index(sec)] = symbols = elf.read_symbols(sec)
+            for sym in symbols:
+                if sym["st_shndx"] == SHN_UNDEF or not sym["name"] or \
+                        sym["type"] in (STT_SECTION, STT_FILE):
+                    continue
+                # 再配置可能ファイルのアドレスはセクションごとなので .text だけ見る
+                if self.is_rel and sym["st_shndx"] != text_ndx:
+                    continue
+                if sym["st_value"] == 0 and not self.is_rel:
+                    continue
+                syms.setdefault(sym["st_value"], (sym["name"], sym["st_size"]))
+
+        self.addrs = sorted(syms)
+        self.names = [syms[addr][0] for addr in self.addrs]
+        self.sizes = [syms[addr][1] for addr in self.addrs]
+
+        secs = sorted(
+            (sec["sh_addr"], sec["sh_addr"] + sec["sh_size"], sec["name"])
+            for sec in elf.sections
+            if sec["sh_flags"] & SHF_ALLOC and sec["sh_size"] and not self.is_rel
+        )
+        self.sec_starts = [sec[0] for sec in secs]
+        self.secs = secs
+
+        # GOTなどのスロット (実行ファイル) / 命令中の再配置 (再配置可能ファイル)
+        # relocsは 位置 -> (シンボル名, 加数, 種類) SHT_RELの加数は命令中にあるのでNone
+        self.got = {}
+        self.relocs = {}
+        self.machine = elf.hdr["e_machine"]
+        for sec in elf.sections:
+            if sec["sh_type"] not in (SHT_REL, SHT_RELA):
+                continue
+            link = sec["sh_link"]
+            if link not in tables:
+                if not 0 < link < len(elf.sections):
+                    continue
+                tables[link] = elf.read_symbols(elf.sections[link])
+            target = elf.sections[sec["sh_info"]]["name"] \
+                if sec["sh_info"] < len(elf.sections) else ""
+            for offset, sym, rtype, addend in self.__relocations(elf, sec):
+                name = ""
+                if sym < len(tables[link]):
+                    sym = tables[link][sym]
+                    name = sym["name"]
+                    if sym["type"] == STT_SECTION and sym["st_shndx"] < len(elf.sections):
+                        name = elf.sections[sym["st_shndx"]]["name"]
+                if not name:
+                    continue
+                if not self.is_rel:
+                    self.got[offset] = name
+                elif target == ".text":
+                    if sec["sh_type"] == SHT_REL:
+                        addend = None
+                    self.relocs[offset] = (name, addend, rtype)
+        self.reloc_offsets = sorted(self.relocs)
+
+    @staticmethod
+    def __relocations(elf: ELF, sec) -> List[Tuple[int, int, int, int]]:
+        fmt, shift = _REL_FMT[(elf.ei_class, sec["sh_type"])]
+        fmt = elf.endian + fmt
+        entsize = struct.calcsize(fmt)
+        data = elf.data(sec)
+        ret = []
+        for row in struct.iter_unpack(fmt, data[:len(data) - len(data) % entsize]):
+            info = row[1]
+            sym = info >> shift
+            rtype = info & ((1 << shift) - 1)
+            addend = row[2] if len(row) == 3 else 0
+            ret.append((row[0], sym, rtype, addend))
+        return ret
+
+    # 表の中身のハッシュ (同じなら注釈も同じになる)
+    def digest(self) -> str:
+        return hashlib.sha1(repr((
+            self.addrs, self.names, self.sizes, self.secs,
+            sorted(self.got.items()), sorted(self.relocs.items()),
+        )).encode()).hexdigest()
+
+    # addrが入っているセクションの (先頭, 末尾, 名前)
+    def __section(self, addr: int) -> Optional[Tuple[int, int, str]]:
+        i = bisect.bisect_right(self.sec_starts, addr) - 1
+        if i >= 0 and addr < self.secs[i][1]:
+            return self.secs[i]
+        return None
+
+    def section_of(self, addr: int) -> Optional[str]:
+        sec = self.__section(addr)
+        return sec[2] if sec else None
+
+    def resolve(self, addr: int) -> Optional[str]:
+        if addr in self.got:
+            return f"GOT[{self.got[addr]}]"
+        i = bisect.bisect_right(self.addrs, addr) - 1
+        sec = self.__section(addr)
+        if i >= 0:
+            off = addr - self.addrs[i]
+            if off == 0:
+                return self.names[i]
+            if off < self.sizes[i]:
+                return f"{self.names[i]}+{hex(off)}"
+            # 大きさが0のシンボル (_GLOBAL_OFFSET_TABLE_など) は同じセクションの中なら使う
+            if self.sizes[i] == 0 and sec is not None and self.__section(self.addrs[i]) == sec:
+                return f"{self.names[i]}+{hex(off)}"
+        if sec is not None:
+            return f"{sec[2]}+{hex(addr - sec[0])}"
+        return None
+
+    # [start, end) の命令にかかっている再配置
+    # PC相対のものは命令の末尾からの距離を足して、実際に指す位置を表示する
+    def reloc_in(self, start: int, end: int) -> Optional[str]:
+        i = bisect.bisect_left(self.reloc_offsets, start)
+        if i >= len(self.reloc_offsets) or self.reloc_offsets[i] >= end:
+            return None
+        offset = self.reloc_offsets[i]
+        name, addend, rtype = self.relocs[offset]
+        if addend is None:
+            return name
+        if self.machine == EM_X86_64 and rtype in _GOT_RELATIVE:
+            name = f"GOT[{name}]"
+            addend += end - offset
+        elif self.machine in (EM_386, EM_X86_64) and rtype in (R_PC32, R_PLT32):
+            addend += end - offset
+        return name if addend == 0 else f"{name}{addend:+#x}"
+
+
+def build_resolver(filepath: str) -> Optional[Resolver]:
+    from peo.fhdr import ElfError
+
+    try:
+        with ELF(filepath) as elf:
+            return Resolver(elf)
+    except (OSError, ElfError):
+        return None
@@ -0,0 +1,140 @@
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from peo.fhdr import ElfError, read_fhdr, walk_files
+from peo.util import Color, format_message, objdump, split_functions, split_inst
+from peo.util import ObjdumpError, file_digest, load_cache, store_cache
+
+
+CACHE_KIND = "insn-index-v1"
+NGRAM = 2
+
+
+# ニーモニックのn-gram (n <= NGRAM) の集合
+def mnemonic_grams(mnems: List[str]) -> List[str]:
+    grams = set()
+    for n in range(1, NGRAM+1):
+        for i in range(len(mnems) - n + 1):
+            grams.add(" ".join(mnems[i:i+n]))
+    return sorted(grams)
+
+
+# 関数ごとに命令列 [アドレス, ニーモニック, オペランド] とn-gramをまとめる
+def build_index(msgs: List[List[str]]) -> List[Dict[str, Any]]:
+    index = []
+    for name, fcn_msgs in split_functions(msgs):
+        insts = []
+        for msg in fcn_msgs[1:]:
+            if len(msg) < 3:
+                continue
+            mnem, ops = split_inst(msg[2])
+            if len(msg) >= 4 and msg[3]:  # objdumpのコメント (参照先のシンボル)
+                ops = f"{ops} # {msg[3]}"
+            insts.append([int(msg[0][:-1], 16), mnem, ops])
+        index.append({
+            "name": name,
+            "grams": mnemonic_grams([inst[1] for inst in insts]),
+            "insts": insts,
+        })
+    return index
+
+
+# バイナリごとのインデックス (ファイルの中身が同じならキャッシュを使う)
+def load_index(filepath: str) -> List[Dict[str, Any]]:
+    key = file_digest(filepath)
+    index = load_cache(CACHE_KIND, key)
+    if index is None:
+        index = build_index(format_message(objdump(filepath)))
+        store_cache(CACHE_KIND, key, index)
+    return index
+
+
+class Pattern:
+    # "lea ; call .*strcpy" のように ; 区切りで命令を並べる
+    # 各命令は "ニーモニック [オペランドの正規表現]"、ニーモニックの * は何にでもマッチする
+    def __init__(self, text: str):
+        self.text = text
+        self.elems = []
+        for elem in text.split(";"):
+            mnem, _, ops = elem.strip().partition(" ")
+            if mnem == "":
+                raise ValueError(f"empty instruction in pattern: {text!r}")
+            self.elems.append((
+                None if mnem == "*" else mnem,
+                re.compile(ops.strip()) if ops.strip() else None
+            ))
+        self.grams = self.__required_grams()
+
+    # マッチする関数が必ず持っているn-gram
+    def __required_grams(self) -> List[str]:
+        grams = []
+        run = []
+        for mnem, _ in self.elems + [(None, None)]:
+            if mnem is not None:
+                run.append(mnem)
+                continue
+            if len(run) == 1:
+                grams.append(run[0])
+            for i in range(len(run) - NGRAM + 1):
+                grams.append(" ".join(run[i:i+NGRAM]))
+            run = []
+        return grams
+
+    def candidate(self, grams) -> bool:
+        return all(g in grams for g in self.grams)
+
+    def match(self, insts: List[List[Any]]) -> Iterator[int]:
+        n = len(self.elems)
+        for i in range(len(insts) - n + 1):
+            for (mnem, ops), inst in zip(self.elems, insts[i:i+n]):
+                if mnem is not None and inst[1] != mnem:
+                    break
+                if ops is not None and ops.search(inst[2]) is None:
+                    break
+            else:
+                yield i
+
+
+def search_file(pattern: str, filepath: str) -> Tuple[List[Tuple], Optional[str]]:
+    try:
+        read_fhdr(filepath)
+    except (OSError, ElfError) as e:
+        return [], e.strerror if isinstance(e, OSError) and e.strerror else str(e)
+
+    try:
+        index = load_index(filepath)
+    except ObjdumpError as e:
+        return [], str(e)
+
+    pat = Pattern(pattern)
+    hits = []
+    for fcn in index:
+        # n-gramが揃っていない関数は命令列を見るまでもない
+        if not pat.candidate(set(fcn["grams"])):
+            continue
+        insts = fcn["insts"]
+        for i in pat.match(insts):
+            matched = insts[i:i+len(pat.elems)]
+            hits.append((fcn["name"], insts[0][0], matched))
+    return hits, None
+
+
+def search(pattern: str, paths: List[str], recursive: bool = False,
+           jobs: Optional[int] = None):
+    Pattern(pattern)  # 不正なパターンは並列に投げる前にはじく
+    files = list(walk_files(paths, recursive))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(search_file, [pattern] * len(files), files)
+        for filepath, (hits, error) in zip(files, results):
+            if error is not None:
+                print(f"{filepath}: {error}", file=sys.stderr)
+                continue
+            for name, start, matched in hits:
+                addr = matched[0][0]
+                insts = " ; ".join(f"{m} {o}".strip() for _, m, o in matched)
+                print(
+                    f"{filepath}:{addr:x} "
+                    f"{Color.greenify(f'<{name}+{hex(addr - start)}>')}: {insts}"
+                )
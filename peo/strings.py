@@ -0,0 +1,125 @@
+import re
+import sys
+import bisect
+import json
+import hashlib
+from typing import Any, Dict, List, Optional, Sequence
+
+from peo.elf import ELF, SHT_NOBITS
+from peo.fhdr import ElfError
+
+
+DEFAULT_SECTIONS = (".rodata", ".data")
+
+# 印字できる文字 (タブ・改行を含む) の並び
+_ascii = re.compile(rb"[\t\n\r\x20-\x7e]+")
+# UTF-16LE: 印字できる文字と \x00 の組の並び
+_utf16 = re.compile(rb"(?:[\t\n\r\x20-\x7e]\x00)+")
+
+
+class StringTable:
+    # 指定したセクションをmapしたまま正規表現で一度に走査して
+    # (アドレス, セクション, エンコーディング, 文字列) をアドレス順に持つ
+    # 最小の長さはここでは絞らず、表示するときに絞る (注釈では短い文字列も使う)
+    def __init__(self, elf: ELF, sections: Sequence[str]=DEFAULT_SECTIONS):
+        self.strings = []
+        self.cstrings = {}  # セクション名 -> (先頭アドレス, 中身) 注釈用
+        for name in sections:
+            sec = elf.section(name)
+            if sec is None or sec["sh_type"] == SHT_NOBITS or not sec["sh_size"]:
+                continue
+            start = sec["sh_offset"]
+            end = start + sec["sh_size"]
+            if end > len(elf.buf):
+                raise ElfError(f"Section {name} is out of the file")
+            base = sec["sh_addr"] - start
+
+            for match in _ascii.finditer(elf.buf, start, end):
+                terminated = match.end() < end and elf.buf[match.end()] == 0
+                self.strings.append({
+                    "addr": base + match.start(), "section": name, "encoding": "ascii",
+                    "string": match.group(0).decode("ascii"), "terminated": terminated,
+                })
+            for match in _utf16.finditer(elf.buf, start, end):
+                if len(match.group(0)) < 4:  # 1文字だけのものはASCIIの文字列の末尾と区別できない
+                    continue
+                self.strings.append({
+                    "addr": base + match.start(), "section": name, "encoding": "utf-16le",
+                    "string": match.group(0).decode("utf-16le"), "terminated": True,
+                })
+            self.cstrings[name] = (sec["sh_addr"], elf.buf[start:end])
+
+        # 同じアドレスではUTF-16LEの方を優先する (ASCIIは1文字目しか取れないため)
+        self.strings.sort(key=lambda s: (s["addr"], s["encoding"] == "ascii"))
+        self.addrs = [s["addr"] for s in self.strings]
+
+    def select(self, min_len: int=4, utf16: bool=True) -> List[Dict[str, Any]]:
+        return [
+            s for s in self.strings
+            if len(s["string"]) >= min_len and (utf16 or s["encoding"] == "ascii")
+        ]
+
+    # 読んだセクションの中身のハッシュ
+    def digest(self) -> str:
+        h = hashlib.sha1()
+        for name, (sh_addr, data) in sorted(self.cstrings.items()):
+            h.update(f"{name}:{sh_addr:x}:{len(data)}:".encode())
+            h.update(data)
+        return h.hexdigest()
+
+    # addrから始まる文字列 (文字列の途中を指すときはそこから後ろ)
+    # 見つからなければ、NULまでのバイト列をそのまま文字にする
+    def at(self, addr: int, section: str=".rodata") -> Optional[str]:
+        lo = bisect.bisect_left(self.addrs, addr)
+        hi = bisect.bisect_right(self.addrs, addr)
+        for s in self.strings[lo:hi]:
+            if s["encoding"] == "utf-16le":
+                return s["string"]
+        # ASCIIの文字列どうしは重ならないので、addrより前で最後のものだけ見ればよい
+        i = hi - 1
+        while i >= 0 and self.strings[i]["encoding"] != "ascii":
+            i -= 1
+        if i >= 0:
+            s = self.strings[i]
+            off = addr - s["addr"]
+            if off < len(s["string"]) and s["terminated"]:
+                return s["string"][off:]
+
+        if section not in self.cstrings:
+            return None
+        sh_addr, data = self.cstrings[section]
+        off = addr - sh_addr
+        if not 0 <= off < len(data):
+            return None
+        end = data.find(b"\0", off)
+        return data[off:end if end >= 0 else len(data)].decode("latin-1")
+
+
+def build_strings(filepath: str, sections: Sequence[str]=DEFAULT_SECTIONS) -> Optional[StringTable]:
+    try:
+        with ELF(filepath) as elf:
+            return StringTable(elf, sections)
+    except (OSError, ElfError):
+        return None
+
+
+def strings(filepath: str, sections: Sequence[str]=DEFAULT_SECTIONS,
+            min_len: int=4, utf16: bool=True, fmt: str="text"):
+    try:
+        with ELF(filepath) as elf:
+            table = StringTable(elf, sections)
+    except (OSError, ElfError) as e:
+        print(f"{filepath}: {e.strerror if isinstance(e, OSError) and e.strerror else e}",
+              file=sys.stderr)
+        return
+
+    for s in table.select(min_len, utf16):
+        if fmt == "jsonl":
+            sys.stdout.write(json.dumps({
+                "addr": s["addr"], "section": s["section"],
+                "encoding": s["encoding"], "string": s["string"],
+            }) + "\n")
+        else:
+            text = s["string"].encode("unicode_escape").decode("ascii")
+            enc = "U" if s["encoding"] == "utf-16le" else " "
+            sys.stdout.write(f"{s['addr']:#10x} {s['section']:<8} {enc} {text}\n")
@@ -1,2 +1,22 @@
-from peo.util.color import *
-from peo.util.parse import *
\ No newline at end of file
+import importlib
+
+
+# 公開する名前 -> 定義しているサブモジュール
+# サブモジュールは属性が参照されたときに初めて読み込む
+# (Colorだけを使う -f などで subprocess や hashlib を読まないため)
+_names = {
+    "Color": "color", "ObjdumpError": "error",
+    "rm_consecutive_spaces": "parse", "format_message": "parse", "format_line": "parse",
+    "batch_lines": "parse", "objdump": "parse", "stream_objdump": "parse",
+    "read_listing": "parse", "split_functions": "parse", "fcn_bounds": "parse",
+    "prefixes": "parse", "split_inst": "parse", "get_section_as_str": "parse",
+    "cache_dir": "cache", "file_digest": "cache", "load_cache": "cache", "store_cache": "cache",
+}
+
+
+def __getattr__(name):
+    if name in _names:
+        module = importlib.import_module(f"peo.util.{_names[name]}")
+        globals()[name] = getattr(module, name)
+        return globals()[name]
+    raise AttributeError(f"module 'peo.util' has no attribute '{name}'")
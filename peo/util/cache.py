@@ -0,0 +1,41 @@
+import os
+import json
+import hashlib
+from typing import Any, Optional
+
+
+# $XDG_CACHE_HOME/peo (なければ ~/.cache/peo)
+def cache_dir() -> str:
+    base = os.environ.get("XDG_CACHE_HOME") or \
+        os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "peo")
+
+
+# ファイルの中身のsha256 (キャッシュのキーになる)
+def file_digest(filepath: str) -> str:
+    h = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_cache(kind: str, key: str) -> Optional[Any]:
+    try:
+        with open(os.path.join(cache_dir(), kind, key + ".json"), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def store_cache(kind: str, key: str, obj: Any):
+    dirpath = os.path.join(cache_dir(), kind)
+    path = os.path.join(dirpath, key + ".json")
+    try:
+        os.makedirs(dirpath, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(obj, f)
+        os.replace(tmp, path)  # 書きかけのファイルを読ませない
+    except OSError:
+        pass  # キャッシュできなくても動作には関係ない
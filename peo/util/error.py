@@ -0,0 +1,9 @@
+# objdumpが失敗した (stderrはobjdumpのエラー出力)
+# 終了するかどうかは呼び出し側 (CLI) で決める
+class ObjdumpError(Exception):
+    def __init__(self, stderr: str):
+        super().__init__(stderr)
+        self.stderr = stderr
+
+    def __str__(self) -> str:
+        return self.stderr.strip() or "objdump failed"
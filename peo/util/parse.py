@@ -1,6 +1,12 @@
 import re
+import sys
+import mmap
+import queue
+import threading
 import subprocess as sp
-from typing import List
+from typing import Iterator, List, Optional, Tuple
+
+from peo.util.error import ObjdumpError
 
 
 # 両端の空白を削除、文中の連続した空白を半角空白1個に置き換え
@@ -14,15 +20,161 @@ def format_message(lines: str) -> List[List[str]]:
 
     msgs = []  # linesを整理したものが入る
     for line in lines:
-        if line == "":  # 何もない行はいらない
+        msg = format_line(line)
+        if msg is not None:
+            msgs.append(msg)
+    return msgs
+
+
+def format_line(line: str) -> Optional[List[str]]:
+    line = line.rstrip("\n")
+    if line == "":  # 何もない行はいらない
+        return None
+    items = re.split("[#\t]", line)  # 行を基本(アドレス、命令、読みやすい命令(、コメント))に分ける
+
+    msg = []  # items(line)を整理したものが入る
+    for item in items:
+        msg.append(rm_consecutive_spaces(item))
+    return msg
+
+
+# 行を見出し(関数名・セクション名)ごとにまとめて渡す
+def batch_lines(lines) -> Iterator[List[List[str]]]:
+    batch = []
+    for line in lines:
+        msg = format_line(line)
+        if msg is None:
             continue
-        items = re.split("[#\t]", line)  # 行を基本(アドレス、命令、読みやすい命令(、コメント))に分ける
+        if len(msg) == 1 and batch:
+            yield batch
+            batch = []
+        batch.append(msg)
+    if batch:
+        yield batch
 
-        msg = []  # items(line)を整理したものが入る
-        for item in items:
-            msg.append(rm_consecutive_spaces(item))
-        msgs.append(msg)
-    return msgs
+
+# objdump -d -M intel を実行する エラーのときはやめる
+def objdump(filepath: str, *options: str) -> str:
+    proc = sp.run(
+        ["objdump", "-d", "-M", "intel", *options, filepath],
+        encoding="utf-8",
+        stdout=sp.PIPE,
+        stderr=sp.PIPE
+    )
+
+    if proc.returncode != 0:
+        raise ObjdumpError(proc.stderr)
+
+    return proc.stdout
+
+
+# objdumpを起動し、出力を読む側のスレッドで行に分けながら関数ごとにキューへ流す
+# objdumpが動いている間に後段の処理を進められる
+def stream_objdump(filepath: str, *options: str, maxsize: int=256) -> Iterator[List[List[str]]]:
+    proc = sp.Popen(
+        ["objdump", "-d", "-M", "intel", *options, filepath],
+        encoding="utf-8",
+        stdout=sp.PIPE,
+        stderr=sp.PIPE
+    )
+    batches = queue.Queue(maxsize)
+    stderr = []
+
+    def read_stdout():
+        for batch in batch_lines(proc.stdout):
+            batches.put(batch)
+        batches.put(None)
+
+    # stderrも読んでおかないとパイプが詰まってobjdumpが止まる
+    def read_stderr():
+        stderr.append(proc.stderr.read())
+
+    readers = [
+        threading.Thread(target=read_stdout, daemon=True),
+        threading.Thread(target=read_stderr, daemon=True)
+    ]
+    for reader in readers:
+        reader.start()
+
+    try:
+        while True:
+            batch = batches.get()
+            if batch is None:
+                break
+            yield batch
+    finally:
+        # 途中でやめたときはobjdumpを止めて、読む側のスレッドを終わらせる
+        if proc.poll() is None and readers[0].is_alive():
+            proc.kill()
+        while readers[0].is_alive():
+            try:
+                batches.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        for reader in readers:
+            reader.join()
+        proc.wait()
+
+    if proc.returncode != 0:
+        raise ObjdumpError("".join(stderr))
+
+
+# 保存しておいた objdump -d -M intel の出力を読む ("-"なら標準入力)
+# ファイルはmapして1行ずつ読むので、大きなものでも全部を読み込まない
+def read_listing(path: str) -> Iterator[List[List[str]]]:
+    if path == "-":
+        yield from batch_lines(sys.stdin)
+        return
+
+    with open(path, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # 空のファイル
+            return
+    with mm:
+        lines = (line.decode("utf-8", "replace") for line in iter(mm.readline, b""))
+        yield from batch_lines(lines)
+
+
+# format_messageの結果を関数ごとに分ける (関数名, 見出しを含む行)
+def split_functions(msgs: List[List[str]]) -> List[Tuple[str, List[List[str]]]]:
+    fcns = []
+    for msg in msgs:
+        if len(msg) == 1:
+            match = re.match(r"[0-9a-f]+ <(.*)>:$", msg[0])
+            if match:
+                fcns.append((match.group(1), [msg]))
+            continue
+        if fcns and re.match("[0-9a-f]+:", msg[0]):
+            fcns[-1][1].append(msg)
+    return fcns
+
+
+# 関数の先頭・末尾アドレス (末尾は最後の命令の次)
+def fcn_bounds(fcn_msgs: List[List[str]]) -> Tuple[int, int]:
+    start = int(fcn_msgs[0][0].split(" ")[0], 16)
+    end = start
+    for msg in fcn_msgs[1:]:
+        if len(msg) >= 2:
+            addr = int(msg[0][:-1], 16)
+            end = max(end, addr + len(msg[1].split()))
+    return start, end
+
+
+# 命令の前につくプレフィックス
+prefixes = [
+    "bnd", "notrack", "lock", "rep", "repz", "repnz", "repe", "repne",
+    "cs", "ds", "es", "ss", "fs", "gs", "data16", "addr32"
+]
+
+
+# 命令を(ニーモニック, オペランド)に分ける プレフィックスはオペランド側に入れない
+def split_inst(inst: str) -> Tuple[str, str]:
+    items = inst.split(" ")
+    i = 0
+    while i < len(items) - 1 and items[i] in prefixes:
+        i += 1
+    return items[i], " ".join(items[i+1:])
 
 
 def get_section_as_str(filepath: str, section: str, ndx: int) -> str:
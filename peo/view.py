@@ -0,0 +1,201 @@
+import re
+import bisect
+import curses
+from functools import lru_cache
+from typing import List, Optional
+
+from peo.util import format_message, objdump, split_functions
+from peo.disasm.disasm import render
+from peo.disasm.context import RenderContext
+
+
+_sgr = re.compile(r"\033\[([0-9;]*)m")
+
+# ANSIの色番号 (30~37) とcursesの色
+_curses_colors = [
+    curses.COLOR_BLACK, curses.COLOR_RED, curses.COLOR_GREEN,
+    curses.COLOR_YELLOW, curses.COLOR_BLUE, curses.COLOR_MAGENTA,
+    curses.COLOR_CYAN, curses.COLOR_WHITE
+]
+
+
+class Viewer:
+    # 関数の区切りだけ先に調べておき、注釈・矢印・色づけは画面に出る関数だけ行う
+    def __init__(self, filepath: str, cache_size: int = 128):
+        self.filepath = filepath
+        self.ctx = RenderContext(filepath)
+        self.fcns = split_functions(format_message(objdump(filepath)))
+
+        # 関数ごとの表示行数は描画しなくてもわかる (見出し + 命令 + 空行)
+        self.offsets = []
+        total = 0
+        for _, msgs in self.fcns:
+            self.offsets.append(total)
+            total += len(msgs) + 1
+        self.total = total
+
+        self.names = {}
+        for i, (name, _) in enumerate(self.fcns):
+            self.names.setdefault(name, i)
+        self.by_addr = sorted(
+            (int(msgs[0][0].split(" ")[0], 16), i)
+            for i, (_, msgs) in enumerate(self.fcns)
+        )
+        self.starts = [addr for addr, _ in self.by_addr]
+
+        self.render_fcn = lru_cache(maxsize=cache_size)(self.__render_fcn)
+
+    def __render_fcn(self, i: int) -> List[str]:
+        # renderは渡した行を書き換えるのでコピーを渡す
+        msgs = [list(msg) for msg in self.fcns[i][1]]
+        return render(self.filepath, msgs, ctx=self.ctx) + [""]
+
+    # 表示行から関数の番号を引く
+    def fcn_at(self, line: int) -> int:
+        return bisect.bisect_right(self.offsets, line) - 1
+
+    def lines(self, top: int, height: int) -> List[str]:
+        ret = []
+        line = top
+        while len(ret) < height and line < self.total:
+            i = self.fcn_at(line)
+            rendered = self.render_fcn(i)
+            skip = line - self.offsets[i]
+            ret += rendered[skip:skip + height - len(ret)]
+            line = self.offsets[i] + len(rendered)
+        return ret
+
+    # シンボル名かアドレスから表示行を求める
+    def locate(self, query: str) -> Optional[int]:
+        query = query.strip()
+        if query in self.names:
+            return self.offsets[self.names[query]]
+        try:
+            addr = int(query, 16)
+        except ValueError:
+            return None
+
+        ndx = bisect.bisect_right(self.starts, addr) - 1
+        if ndx < 0:
+            return None
+        i = self.by_addr[ndx][1]
+        msgs = self.fcns[i][1]
+        line = self.offsets[i]
+        for j, msg in enumerate(msgs[1:], 1):
+            if int(msg[0][:-1], 16) > addr:
+                break
+            line = self.offsets[i] + j
+        return line
+
+    def run(self, stdscr):
+        curses.curs_set(0)
+        attrs = self.__init_colors()
+        top = 0
+        while True:
+            height, width = stdscr.getmaxyx()
+            body = height - 1
+            stdscr.erase()
+            for y, text in enumerate(self.lines(top, body)):
+                self.__addstr_ansi(stdscr, y, text, width, attrs)
+
+            name = self.fcns[self.fcn_at(top)][0] if self.fcns else ""
+            status = f" {self.filepath}  <{name}>  {top+1}/{self.total}" \
+                "  [q]uit [/]jump [n/p]function [g/G]top/bottom"
+            stdscr.addnstr(body, 0, status.ljust(width - 1), width - 1, curses.A_REVERSE)
+            stdscr.refresh()
+
+            key = stdscr.getch()
+            if key in (ord("q"), 27):
+                break
+            elif key in (ord("j"), curses.KEY_DOWN, curses.KEY_ENTER, 10):
+                top += 1
+            elif key in (ord("k"), curses.KEY_UP):
+                top -= 1
+            elif key in (ord(" "), ord("f"), curses.KEY_NPAGE):
+                top += body
+            elif key in (ord("b"), curses.KEY_PPAGE):
+                top -= body
+            elif key in (ord("g"), curses.KEY_HOME):
+                top = 0
+            elif key in (ord("G"), curses.KEY_END):
+                top = self.total - body
+            elif key == ord("n"):  # 次の関数
+                top = self.offsets[min(self.fcn_at(top) + 1, len(self.fcns) - 1)]
+            elif key == ord("p"):  # 前の関数
+                top = self.offsets[max(self.fcn_at(top) - 1, 0)]
+            elif key in (ord("/"), ord(":")):
+                line = self.locate(self.__prompt(stdscr, body, width, "jump to (symbol or address): "))
+                if line is not None:
+                    top = line
+                else:
+                    curses.beep()
+            top = max(0, min(top, self.total - 1))
+
+    @staticmethod
+    def __prompt(stdscr, y: int, width: int, msg: str) -> str:
+        stdscr.move(y, 0)
+        stdscr.clrtoeol()
+        stdscr.addnstr(y, 0, msg, width - 1)
+        curses.echo()
+        curses.curs_set(1)
+        try:
+            query = stdscr.getstr(y, min(len(msg), width - 1)).decode("utf-8", "replace")
+        finally:
+            curses.noecho()
+            curses.curs_set(0)
+        return query
+
+    @staticmethod
+    def __init_colors() -> List[int]:
+        if not curses.has_colors():
+            return [0] * len(_curses_colors)
+        curses.start_color()
+        try:
+            curses.use_default_colors()
+            bg = -1
+        except curses.error:
+            bg = curses.COLOR_BLACK
+        attrs = []
+        for n, color in enumerate(_curses_colors, 1):
+            curses.init_pair(n, color, bg)
+            attrs.append(curses.color_pair(n))
+        return attrs
+
+    # ANSIのエスケープシーケンスをcursesの属性に置き換えて書く
+    @staticmethod
+    def __addstr_ansi(stdscr, y: int, text: str, width: int, attrs: List[int]):
+        x = 0
+        attr = 0
+        pos = 0
+        for match in list(_sgr.finditer(text)) + [None]:
+            end = match.start() if match else len(text)
+            chunk = text[pos:end]
+            if chunk and x < width - 1:
+                try:
+                    stdscr.addnstr(y, x, chunk, width - 1 - x, attr)
+                except curses.error:
+                    pass
+                x += len(chunk)
+            if match is None:
+                break
+            pos = match.end()
+            for code in (match.group(1) or "0").split(";"):
+                code = int(code or 0)
+                if code == 0:
+                    attr = 0
+                elif code == 1:
+                    attr |= curses.A_BOLD
+                elif code == 4:
+                    attr |= curses.A_UNDERLINE
+                elif code == 5:
+                    attr |= curses.A_BLINK
+                elif code == 24:
+                    attr &= ~curses.A_UNDERLINE
+                elif code == 25:
+                    attr &= ~curses.A_BLINK
+                elif 30 <= code <= 37:
+                    attr = (attr & ~curses.A_COLOR) | attrs[code - 30]
+
+
+def view(filepath: str, cache_size: int = 128):
+    curses.wrapper(Viewer(filepath, cache_size).run)
@@ -0,0 +1,46 @@
+import pytest
+
+from peo.archive import AR_MAGIC, AR_THIN_MAGIC, AR_HDR_SIZE, parse_members
+from peo.fhdr import ElfError
+
+
+def header(name: str, size: int) -> bytes:
+    hdr = (f"{name:<16}{0:<12}{0:<6}{0:<6}{644:<8}{size:<10}").encode() + b"`\n"
+    assert len(hdr) == AR_HDR_SIZE
+    return hdr
+
+
+def member(name: str, data: bytes) -> bytes:
+    return header(name, len(data)) + data + (b"\n" if len(data) % 2 else b"")
+
+
+# シンボル表・GNUの長い名前・BSDの名前・奇数の大きさのメンバーを含むアーカイブ
+def test_parse_members():
+    longnames = b"a_very_long_member_name.o/\nanother_long_name32.o/\n"
+    bsd_name = b"bsd_style_name.o"
+    buf = AR_MAGIC
+    buf += member("/", b"\0\0\0\0")                  # シンボル表
+    buf += member("//", longnames)                   # 長い名前の表
+    buf += member("short.o/", b"abc")                # 奇数の大きさ (詰め物あり)
+    buf += member("/0", b"long1")
+    buf += member(f"/{longnames.index(b'another')}", b"long2!")
+    buf += member(f"#1/{len(bsd_name)}", bsd_name + b"bsd")
+
+    members = parse_members(buf)
+    assert [m["name"] for m in members] == [
+        "short.o", "a_very_long_member_name.o", "another_long_name32.o", "bsd_style_name.o",
+    ]
+    for m, data in zip(members, [b"abc", b"long1", b"long2!", b"bsd"]):
+        assert m["size"] == len(data)
+        assert buf[m["offset"]:m["offset"] + m["size"]] == data
+
+
+def test_rejects_thin_and_truncated():
+    with pytest.raises(ElfError, match="Thin"):
+        parse_members(AR_THIN_MAGIC + member("a.o/", b"ab"))
+    with pytest.raises(ElfError, match="Truncated"):
+        parse_members(AR_MAGIC + member("a.o/", b"abcdef")[:-2])
+    with pytest.raises(ElfError, match="Malformed"):
+        parse_members(AR_MAGIC + member("a.o/", b"ab")[:58] + b"xx" + b"ab")
+    with pytest.raises(ElfError, match="Not an archive"):
+        parse_members(b"\x7fELF" + b"\0" * 60)
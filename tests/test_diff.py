@@ -0,0 +1,50 @@
+import shutil
+import subprocess
+
+import pytest
+
+from peo.util import format_message, objdump
+from peo.resolver import build_resolver
+from peo.diff import hash_functions, match_functions
+
+
+SOURCE = """
+#include <stdio.h>
+void g(void) { puts("%s"); }
+int main(void) { puts("main says hi"); g(); return 0; }
+"""
+
+
+def build(tmp_path, name, message):
+    src = tmp_path / f"{name}.c"
+    src.write_text(SOURCE % message)
+    out = str(tmp_path / name)
+    subprocess.run(["gcc", "-O1", "-fno-inline", "-fno-pic", "-no-pie", "-o", out, str(src)],
+                   check=True)
+    return out
+
+
+def table(path):
+    return hash_functions(format_message(objdump(path)), build_resolver(path))
+
+
+# 文字列がずれて即値のアドレスが変わっただけの関数は変更にしない
+def test_moved_immediate_is_not_a_change(tmp_path):
+    if shutil.which("gcc") is None or shutil.which("objdump") is None:
+        pytest.skip("gcc and objdump are required")
+    old = table(build(tmp_path, "old", "short"))
+    new = table(build(tmp_path, "new", "a much longer string"))
+    assert match_functions(old, new)["changed"] == []
+
+
+def test_match_functions():
+    old = {"f": {"hash": "1", "start": 0}, "g": {"hash": "2", "start": 8},
+           "h": {"hash": "3", "start": 16}, "k": {"hash": "4", "start": 24}}
+    new = {"f": {"hash": "1", "start": 0}, "g": {"hash": "9", "start": 8},
+           "h2": {"hash": "3", "start": 16}, "m": {"hash": "5", "start": 24}}
+    result = match_functions(old, new)
+    assert result["unchanged"] == ["f"]
+    assert result["changed"] == ["g"]
+    assert result["renamed"] == [("h", "h2")]
+    assert result["added"] == ["m"]
+    assert result["removed"] == ["k"]
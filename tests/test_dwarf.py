@@ -0,0 +1,31 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from peo.elf import ELF
+from peo.dwarf import decode_lines
+
+
+# 相対パスでコンパイルしても、ファイル名はDW_AT_comp_dirからの絶対パスになる
+@pytest.mark.parametrize("version", [4, 5])
+def test_files_are_resolved_against_comp_dir(tmp_path, version):
+    if shutil.which("gcc") is None:
+        pytest.skip("gcc is required")
+    (tmp_path / "src").mkdir()
+    (tmp_path / "inc").mkdir()
+    (tmp_path / "inc" / "h.h").write_text("static inline int h(int x) { return x * 3; }\n")
+    (tmp_path / "src" / "m.c").write_text(
+        '#include "h.h"\nint main(int c, char **v) { return h(c); }\n'
+    )
+    subprocess.run(
+        ["gcc", "-g", f"-gdwarf-{version}", "-O1", "-Iinc", "src/m.c", "-o", "m"],
+        cwd=tmp_path, check=True
+    )
+
+    with ELF(str(tmp_path / "m")) as elf:
+        files = decode_lines(elf)["files"]
+    root = os.path.realpath(tmp_path)
+    assert os.path.join(root, "src", "m.c") in [os.path.realpath(f) for f in files]
+    assert os.path.join(root, "inc", "h.h") in [os.path.realpath(f) for f in files]
@@ -0,0 +1,57 @@
+import struct
+
+import pytest
+
+from peo.elf import ELF
+from peo.fhdr import ElfError
+
+
+TEXT = b"\x90\xc3"
+SHSTRTAB = b"\0.shstrtab\0.text\0"
+
+
+# プログラムヘッダ1つと、セクション3つ (NULL・.shstrtab・.text) だけのELF
+def build(is64: bool, endian: str) -> bytes:
+    ehsize = 64 if is64 else 52
+    phfmt = endian + ("IIQQQQQQ" if is64 else "IIIIIIII")
+    shfmt = endian + ("IIQQQQIIQQ" if is64 else "IIIIIIIIII")
+    phentsize = struct.calcsize(phfmt)
+    shentsize = struct.calcsize(shfmt)
+    phoff = ehsize
+    shstr_off = phoff + phentsize
+    text_off = shstr_off + len(SHSTRTAB)
+    shoff = text_off + len(TEXT)
+
+    if is64:
+        ph = struct.pack(phfmt, 1, 5, text_off, 0x1000, 0x1000, len(TEXT), len(TEXT), 0x1000)
+    else:
+        ph = struct.pack(phfmt, 1, text_off, 0x1000, 0x1000, len(TEXT), len(TEXT), 5, 0x1000)
+    sh = struct.pack(shfmt, *[0] * 10)
+    sh += struct.pack(shfmt, 1, 3, 0, 0, shstr_off, len(SHSTRTAB), 0, 0, 1, 0)
+    sh += struct.pack(shfmt, 11, 1, 6, 0x1000, text_off, len(TEXT), 0, 0, 16, 0)
+
+    ident = b"\x7fELF" + bytes([2 if is64 else 1, 1 if endian == "<" else 2, 1, 0]) + b"\0" * 8
+    ehfmt = endian + ("HHIQQQIHHHHHH" if is64 else "HHIIIIIHHHHHH")
+    eh = ident + struct.pack(ehfmt, 2, 62, 1, 0x1000, phoff, shoff, 0, ehsize,
+                             phentsize, 1, shentsize, 3, 1)
+    return eh + ph + SHSTRTAB + TEXT + sh
+
+
+@pytest.mark.parametrize("is64,endian", [(True, "<"), (False, "<"), (True, ">"), (False, ">")])
+def test_tables(is64, endian):
+    elf = ELF("memory", build(is64, endian))
+    assert [sec["name"] for sec in elf.sections] == ["", ".shstrtab", ".text"]
+    text = elf.section(".text")
+    assert text["sh_addr"] == 0x1000
+    assert elf.data(text) == TEXT
+
+    assert len(elf.segments) == 1
+    seg = elf.segments[0]
+    assert (seg["p_type"], seg["p_flags"], seg["p_vaddr"], seg["p_filesz"]) == (1, 5, 0x1000, 2)
+    assert elf.vaddr_to_offset(0x1001) == text["sh_offset"] + 1
+
+
+def test_truncated_section_table():
+    buf = build(True, "<")
+    with pytest.raises(ElfError, match="Truncated section header"):
+        ELF("memory", buf[:-8]).sections
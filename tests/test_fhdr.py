@@ -0,0 +1,27 @@
+import struct
+
+from peo.fhdr import fhdr
+
+
+# 定義にないe_machine (RISC-V) でも落ちずに16進で表示する
+def test_unknown_machine(tmp_path, capsys):
+    path = tmp_path / "riscv"
+    path.write_bytes(b"\x7fELF\x02\x01\x01\x00" + b"\0" * 8 + struct.pack(
+        "<HHIQQQIHHHHHH", 3, 0xf3, 1, 0x1000, 64, 0x2000, 5, 64, 56, 2, 64, 10, 9))
+    fhdr(str(path))
+    out = capsys.readouterr().out
+    assert "Machine:                           0xf3" in out
+    assert "Entry point address:               0x0000000000001000" in out
+
+
+# MSBのファイルはビッグエンディアンで読む
+def test_big_endian(tmp_path, capsys):
+    path = tmp_path / "ppc"
+    path.write_bytes(b"\x7fELF\x01\x02\x01\x00" + b"\0" * 8 + struct.pack(
+        ">HHIIIIIHHHHHH", 2, 0x14, 1, 0x10000400, 52, 0x3000, 0, 52, 32, 3, 40, 20, 19))
+    fhdr(str(path))
+    out = capsys.readouterr().out
+    assert "Data:                              MSB" in out
+    assert "Type:                              EXEC" in out
+    assert "Entry point address:               0x10000400" in out
+    assert "Number of section headers:         0x0014" in out
@@ -0,0 +1,64 @@
+import subprocess
+import sys
+
+
+# peo -f FILE を別プロセスで実行し、読み込まれたモジュールの一覧を返す
+def imported_modules(*args):
+    code = (
+        "import sys\n"
+        f"sys.argv = ['peo', *{list(args)!r}]\n"
+        "from peo.core import main\n"
+        "main()\n"
+        "print('\\n'.join(sorted(sys.modules)), file=sys.stderr)\n"
+    )
+    proc = subprocess.run(
+        [sys.executable, "-c", code], stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE, encoding="utf-8", check=True
+    )
+    return set(proc.stderr.split())
+
+
+def test_fhdr_does_not_load_objdump_helpers():
+    modules = imported_modules("-f", sys.executable)
+    # objdumpの実行・キャッシュのためのモジュールは -f では読まない
+    for name in ("subprocess", "mmap", "hashlib", "peo.util.parse", "peo.util.cache",
+                 "json", "threading", "concurrent.futures"):
+        assert name not in modules
+
+
+def test_checksec_does_not_load_worker_pools():
+    modules = imported_modules("-c", sys.executable)
+    # アーカイブのときだけ使うモジュールは1ファイルの -c では読まない
+    for name in ("concurrent.futures", "multiprocessing", "tempfile"):
+        assert name not in modules
+
+
+# サブモジュールを先に読み込んでも、パッケージの公開名は関数のまま
+def test_public_names_do_not_depend_on_import_order():
+    code = (
+        "import peo.disasm.disasm, peo.disasm.setcolor, peo.disasm.indent\n"
+        "from peo.disasm import disasm, setcolor, indent\n"
+        "print(all(callable(f) for f in (disasm, setcolor, indent)))\n"
+    )
+    proc = subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE,
+                          encoding="utf-8", check=True)
+    assert proc.stdout.strip() == "True"
+
+
+# 起動時の読み込み時間 (python -X importtime) が予算に収まる
+# 予算は今の数倍にしてあり、重いモジュールを先頭でimportしたときだけ落ちる
+IMPORT_BUDGET_US = {"peo.core": 150000, "peo.fhdr": 100000}
+
+
+def test_startup_import_time():
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import peo.core, peo.fhdr"],
+        stderr=subprocess.PIPE, encoding="utf-8", check=True
+    )
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        fields = [f.strip() for f in line.split("|")]
+        if len(fields) == 3 and fields[1].isdigit():
+            cumulative[fields[2]] = int(fields[1])
+    for name, budget in IMPORT_BUDGET_US.items():
+        assert cumulative[name] < budget, f"{name} took {cumulative[name]}us"
@@ -0,0 +1,17 @@
+import shutil
+
+import pytest
+
+from peo.util import ObjdumpError, objdump, stream_objdump
+
+
+# objdumpが失敗しても終了せず、エラー出力を持った例外にする
+def test_objdump_error_carries_stderr(tmp_path):
+    if shutil.which("objdump") is None:
+        pytest.skip("objdump is required")
+    path = tmp_path / "text"
+    path.write_text("not an object file\n")
+    with pytest.raises(ObjdumpError, match="file format not recognized"):
+        objdump(str(path))
+    with pytest.raises(ObjdumpError, match="file format not recognized"):
+        list(stream_objdump(str(path)))
@@ -0,0 +1,69 @@
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from peo.util import format_message, objdump, read_listing
+from peo.disasm.disasm import render, render_batches, disasm_listing
+from peo.disasm.context import RenderContext
+
+
+SOURCES = {
+    "loop": """
+#include <stdio.h>
+int f(int x) { int s = 0; for (int i = 0; i < x; i++) { if (i % 3) s += i; else s -= 1; } return s; }
+int main(int c, char **v) { printf("%d %s\\n", f(c), v[0]); return 0; }
+""",
+    "switch": """
+#include <string.h>
+char buf[64];
+int g(int x) { switch (x) { case 0: return 3; case 1: return 7; case 2: return 11; default: return -1; } }
+int main(int c, char **v) { strcpy(buf, "hello world"); return g(c) + (int)strlen(buf); }
+""",
+}
+
+
+@pytest.fixture(scope="module")
+def binaries(tmp_path_factory):
+    if shutil.which("gcc") is None or shutil.which("objdump") is None:
+        pytest.skip("gcc and objdump are required")
+    tmp = tmp_path_factory.mktemp("bin")
+    paths = []
+    for name, code in SOURCES.items():
+        src = tmp / f"{name}.c"
+        src.write_text(code)
+        out = str(tmp / name)
+        subprocess.run(["gcc", "-O0", "-o", out, str(src)], check=True)
+        paths.append(out)
+    return paths
+
+
+def render_file(filepath):
+    msgs = format_message(objdump(filepath))
+    return render(filepath, msgs, ctx=RenderContext(filepath))
+
+
+# 2つのバイナリをスレッドで同時に(何度も)描画しても、1つずつ描画したときと同じになる
+def test_render_in_parallel_threads(binaries):
+    serial = {path: render_file(path) for path in binaries}
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        jobs = [(path, executor.submit(render_file, path)) for path in binaries * 3]
+        for path, future in jobs:
+            assert future.result() == serial[path]
+
+    # 同じプロセスで描画し直しても幅がずれない
+    for path in binaries:
+        assert render_file(path) == serial[path]
+
+
+# 保存した出力は関数ごとに描いて表示する (列のそろえ方以外は全体を描いたときと同じ)
+def test_listing_is_rendered_per_function(binaries, tmp_path, capsys):
+    listing = tmp_path / "loop.lst"
+    listing.write_text(objdump(binaries[0]))
+    whole = render_batches(None, read_listing(str(listing)))
+
+    disasm_listing(str(listing))
+    streamed = capsys.readouterr().out.rstrip("\n").split("\n")
+    assert [line.split() for line in streamed] == [line.split() for line in whole]
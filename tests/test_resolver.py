@@ -0,0 +1,24 @@
+import shutil
+import subprocess
+
+import pytest
+
+from peo.resolver import build_resolver
+
+
+# 大きさが0のシンボルも、同じセクションの中ならシンボル+オフセットで表す
+def test_zero_size_symbol(tmp_path):
+    if shutil.which("gcc") is None:
+        pytest.skip("gcc is required")
+    src = tmp_path / "got.c"
+    src.write_text('#include <stdio.h>\nint main(void) { puts("hi"); return 0; }\n')
+    out = str(tmp_path / "got")
+    subprocess.run(["gcc", "-O0", "-Wl,-z,lazy", "-o", out, str(src)], check=True)
+
+    resolver = build_resolver(out)
+    if "_GLOBAL_OFFSET_TABLE_" not in resolver.names:
+        pytest.skip("no _GLOBAL_OFFSET_TABLE_ in this toolchain's output")
+    i = resolver.names.index("_GLOBAL_OFFSET_TABLE_")
+    assert resolver.sizes[i] == 0
+    got = resolver.addrs[i]
+    assert resolver.resolve(got + 8) == "_GLOBAL_OFFSET_TABLE_+0x8"
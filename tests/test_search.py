@@ -0,0 +1,37 @@
+import pytest
+
+from peo.search import Pattern, mnemonic_grams
+
+
+INSTS = [
+    [0x10, "push", "rbp"],
+    [0x11, "lea", "rdi,[rip+0x10] # 2004 <buf>"],
+    [0x18, "call", "1030 <strcpy@plt>"],
+    [0x1d, "mov", "eax,0x0"],
+    [0x22, "lea", "rsi,[rbp-0x20]"],
+    [0x26, "call", "1040 <puts@plt>"],
+]
+
+
+def test_match():
+    pat = Pattern("lea ; call .*strcpy")
+    assert list(pat.match(INSTS)) == [1]
+    # ニーモニックの * は何にでもマッチする
+    assert list(Pattern("lea rsi ; *").match(INSTS)) == [4]
+    assert list(Pattern("call ; * eax ; lea").match(INSTS)) == [2]
+    assert list(Pattern("ret").match(INSTS)) == []
+
+
+# n-gramの候補は、マッチする関数をふるい落とさない
+def test_candidate():
+    grams = set(mnemonic_grams([inst[1] for inst in INSTS]))
+    assert Pattern("lea ; call .*strcpy").grams == ["lea call"]
+    assert Pattern("call ; * ; lea").grams == ["call", "lea"]
+    assert Pattern("lea ; call").candidate(grams)
+    assert not Pattern("call ; lea").candidate(grams)
+    assert not Pattern("ret").candidate(grams)
+
+
+def test_empty_instruction():
+    with pytest.raises(ValueError):
+        Pattern("lea ; ; call")
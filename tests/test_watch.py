@@ -0,0 +1,51 @@
+import shutil
+import importlib
+import subprocess
+
+import pytest
+
+from peo.util import format_message, objdump
+from peo.disasm.context import RenderContext
+
+
+SOURCE = """
+#include <stdio.h>
+int main(void) { puts("%s"); return 0; }
+"""
+
+
+def build(tmp_path, message):
+    src = tmp_path / "w.c"
+    src.write_text(SOURCE % message)
+    out = str(tmp_path / "w")
+    subprocess.run(["gcc", "-O0", "-o", out, str(src)], check=True)
+    return out
+
+
+# 命令が同じで文字列だけ変わったバイナリでも、新しい文字列で描き直す
+def test_rerender_after_rebuild(tmp_path, capsys, monkeypatch):
+    if shutil.which("gcc") is None or shutil.which("objdump") is None:
+        pytest.skip("gcc and objdump are required")
+    # peo.disasm の属性 disasm は関数なので、モジュールはimport_moduleで取る
+    module = importlib.import_module("peo.disasm.disasm")
+    rerender = getattr(module, "__rerender")
+
+    path = build(tmp_path, "first version")
+    ctx = RenderContext(path)
+    digests, rendered = rerender(ctx, format_message(objdump(path)), "main", None, {})
+    assert "first version" in capsys.readouterr().out
+
+    # 同じバイナリなら描き直さない (注釈もつけ直さない)
+    def no_comment(*args):
+        raise AssertionError("Comment was called for an unchanged function")
+    monkeypatch.setattr(module, "Comment", no_comment)
+    digests, rendered = rerender(ctx, format_message(objdump(path)), "main", digests, rendered)
+    assert "0 changed" in capsys.readouterr().out
+    monkeypatch.undo()
+
+    path = build(tmp_path, "other version")
+    ctx = RenderContext(path, ctx.palette)
+    rerender(ctx, format_message(objdump(path)), "main", digests, rendered)
+    out = capsys.readouterr().out
+    assert "other version" in out
+    assert "first version" not in out